@@ -1,22 +1,60 @@
+import argparse
+import itertools
+import json
 import os
+import sqlite3
+import sys
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from supabase import create_client, Client
 
+from pco_rate_limit import pco_limiter
+
 
 # -----------------------------
 # CONFIG
 # -----------------------------
-FORM_ID = "167650"
+# Forms to ingest: PCO form id -> Supabase table and {form field id: column}.
+# CC_FORMS can replace this with JSON of the same shape to add the kids
+# check-in and events cards once their field ids are mapped.
+FORMS: Dict[str, Dict[str, Any]] = {
+    "167650": {
+        "name": "Guest card",
+        "table": "submissions",
+        "fields": {
+            "1128354": "submission_date",
+            "1128358": "service_time",
+            "1128356": "attendance_status",
+            "1128357": "welcome_note",
+            "1128355": "prayer_request",
+            "1128353": "phone_number",
+        },
+    },
+}
+if os.getenv("CC_FORMS"):
+    FORMS = json.loads(os.environ["CC_FORMS"])
+
+PCO_FORMS_URL = "https://api.planningcenteronline.com/people/v2/forms"
 PER_PAGE = 50
-MAX_PAGES = 10
+# Submissions written per Supabase upsert call.
+UPSERT_BATCH_SIZE = int(os.getenv("CC_UPSERT_BATCH_SIZE", str(PER_PAGE)))
 REQUEST_TIMEOUT = 30
+# On-disk planning_center_id -> people.id cache, kept between runs by the
+# workflow's actions/cache step and rebuilt once it is older than the max age.
+PEOPLE_CACHE_PATH = os.getenv("PEOPLE_CACHE_PATH", ".people_cache.sqlite3")
+PEOPLE_CACHE_MAX_AGE_DAYS = float(os.getenv("PEOPLE_CACHE_MAX_AGE_DAYS", "7"))
+FETCH_WORKERS = int(os.getenv("CC_FETCH_WORKERS", "8"))
+# Runs a submission may fail before the checkpoint moves past it anyway.
+MAX_SUBMISSION_ATTEMPTS = int(os.getenv("CC_MAX_SUBMISSION_ATTEMPTS", "5"))
 
 PCO_APP_ID = os.environ["PCO_APP_ID"]
 PCO_SECRET = os.environ["PCO_SECRET"]
@@ -30,6 +68,17 @@ SUPABASE_SERVICE_ROLE_KEY = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
 auth = HTTPBasicAuth(PCO_APP_ID, PCO_SECRET)
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
+# One pooled session for every PCO call, sized for the fetch workers.
+session = requests.Session()
+session.auth = auth
+session.mount("https://", HTTPAdapter(pool_maxsize=FETCH_WORKERS * len(FORMS)))
+
+
+def pco_get(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    response = pco_limiter.request(lambda: session.get(url, params=params, timeout=REQUEST_TIMEOUT))
+    response.raise_for_status()
+    return response.json()
+
 
 # -----------------------------
 # HELPERS
@@ -43,6 +92,15 @@ def parse_pco_datetime(value: Optional[str]) -> Optional[datetime]:
         return None
 
 
+def submission_person_id(submission: Dict[str, Any]) -> Optional[str]:
+    person_rel = (
+        submission.get("relationships", {})
+        .get("person", {})
+        .get("data")
+    )
+    return person_rel.get("id") if person_rel else None
+
+
 def map_person(person_id: str, person_info: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "id": str(uuid.uuid4()),
@@ -61,110 +119,309 @@ def map_person(person_id: str, person_info: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def fetch_submission_values(submission_id: str) -> Dict[str, Any]:
-    url = (
-        f"https://api.planningcenteronline.com/people/v2/forms/"
-        f"{FORM_ID}/form_submissions/{submission_id}/form_submission_values"
-    )
-    response = requests.get(url, auth=auth, timeout=REQUEST_TIMEOUT)
-    response.raise_for_status()
-    payload = response.json()
-
-    answers: Dict[str, Any] = {
-        "submission_date": None,
-        "service_time": None,
-        "attendance_status": None,
-        "welcome_note": None,
-        "prayer_request": None,
-        "phone_number": None,
-    }
+def fetch_submission_values(form_id: str, submission_id: str) -> Dict[str, Any]:
+    url = f"{PCO_FORMS_URL}/{form_id}/form_submissions/{submission_id}/form_submission_values"
+    payload = pco_get(url)
+    return map_answers(payload.get("data", []), FORMS[form_id]["fields"])
 
-    for value in payload.get("data", []):
+
+def map_answers(values: List[Dict[str, Any]], fields: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Maps form_submission_values onto columns through the form's field map.
+    """
+    answers: Dict[str, Any] = dict.fromkeys(fields.values())
+
+    for value in values:
         field_rel = value.get("relationships", {}).get("form_field", {}).get("data", {})
-        field_id = field_rel.get("id")
-        display_value = value.get("attributes", {}).get("display_value", "")
-
-        if field_id == "1128354":
-            answers["submission_date"] = display_value
-        elif field_id == "1128358":
-            answers["service_time"] = display_value
-        elif field_id == "1128356":
-            answers["attendance_status"] = display_value
-        elif field_id == "1128357":
-            answers["welcome_note"] = display_value
-        elif field_id == "1128355":
-            answers["prayer_request"] = display_value
-        elif field_id == "1128353":
-            answers["phone_number"] = display_value
+        column = fields.get(field_rel.get("id"))
+        if column:
+            answers[column] = value.get("attributes", {}).get("display_value", "")
 
     return answers
 
 
-def find_or_create_person(
-    person_id_ref: Optional[str],
-    people_lookup: Dict[str, Dict[str, Any]],
-    people_cache: Dict[str, Optional[str]],
-) -> Optional[str]:
-    if not person_id_ref:
+def included_answers(
+    submission: Dict[str, Any],
+    values_lookup: Dict[str, Dict[str, Any]],
+    fields: Dict[str, str],
+) -> Optional[Dict[str, Any]]:
+    """
+    Answers for a submission from the page's included form_submission_values,
+    or None when the listing did not side-load them.
+    """
+    refs = (
+        submission.get("relationships", {})
+        .get("form_submission_values", {})
+        .get("data")
+    )
+    if refs is None:
         return None
+    return map_answers([values_lookup[ref["id"]] for ref in refs if ref["id"] in values_lookup], fields)
 
-    if person_id_ref in people_cache:
-        return people_cache[person_id_ref]
 
-    existing = (
-        supabase.table("people")
-        .select("id")
-        .eq("planning_center_id", person_id_ref)
-        .limit(1)
-        .execute()
-    )
+def fetch_page_values(
+    form_id: str,
+    submission_ids: List[str],
+) -> List[Tuple[Optional[Dict[str, Any]], Optional[Exception]]]:
+    """
+    Fetches the answers for a page of submissions concurrently. Returns
+    (answers, error) per submission, in the order given.
+    """
 
-    if existing.data:
-        person_uuid = existing.data[0]["id"]
-        people_cache[person_id_ref] = person_uuid
-        return person_uuid
+    def fetch(submission_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[Exception]]:
+        try:
+            return fetch_submission_values(form_id, submission_id), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        return list(pool.map(fetch, submission_ids))
+
+
+# Query builders shared with cc_async_engine; callers run .execute() (or await it).
+def people_select(client: Any, person_ids: List[str]) -> Any:
+    return client.table("people").select("id,planning_center_id").in_("planning_center_id", person_ids)
 
-    person_info = people_lookup.get(person_id_ref)
-    if not person_info:
-        people_cache[person_id_ref] = None
-        return None
 
-    new_person = map_person(person_id_ref, person_info)
-    inserted = supabase.table("people").insert(new_person).execute()
-    person_uuid = inserted.data[0]["id"]
+def people_insert(client: Any, new_people: List[Dict[str, Any]]) -> Any:
+    # Needs the people_planning_center_id_key constraint (see CHECKPOINT below).
+    return client.table("people").upsert(new_people, on_conflict="planning_center_id", ignore_duplicates=True)
 
-    people_cache[person_id_ref] = person_uuid
-    return person_uuid
 
+def submissions_upsert(client: Any, table: str, rows: Any) -> Any:
+    return client.table(table).upsert(rows, on_conflict="submission_id")
 
-def upsert_submission(
+
+class PeopleResolver:
+    """
+    Maps planning_center_id -> people.id a page at a time: one `in_` lookup
+    for the ids not cached yet, then one bulk upsert for the people missing
+    from Supabase. Ids are de-duplicated first, so two submissions from the
+    same new person create a single row.
+
+    Resolved ids persist in a SQLite file and are warm-loaded in one query,
+    so regular attendees cost nothing on later runs. Entries go stale when a
+    people row is deleted or merged away; invalidate() drops them (the
+    submission upsert then fails its person_id foreign key), and the whole
+    file is rebuilt after PEOPLE_CACHE_MAX_AGE_DAYS.
+    """
+
+    def __init__(self, cache_path: Optional[str] = PEOPLE_CACHE_PATH) -> None:
+        self.cache: Dict[str, Optional[str]] = {}
+        self.lock = threading.Lock()
+        self.db: Optional[sqlite3.Connection] = None
+        if cache_path:
+            self.db = sqlite3.connect(cache_path, check_same_thread=False)
+            self.db.execute(
+                "create table if not exists people_cache ("
+                "planning_center_id text primary key, person_id text not null, cached_at real not null)"
+            )
+            max_age = PEOPLE_CACHE_MAX_AGE_DAYS * 86400
+            with self.db:
+                self.db.execute("delete from people_cache where cached_at < ?", (time.time() - max_age,))
+            self.cache.update(self.db.execute("select planning_center_id, person_id from people_cache"))
+            print(f"Loaded {len(self.cache)} cached people from {cache_path}")
+
+    def resolve(
+        self,
+        person_ids: List[Optional[str]],
+        people_lookup: Dict[str, Dict[str, Any]],
+    ) -> Dict[str, Optional[str]]:
+        wanted = {pid for pid in person_ids if pid}
+        with self.lock:
+            unknown = [pid for pid in wanted if pid not in self.cache]
+            if unknown:
+                self._load(unknown, people_lookup)
+            return {pid: self.cache.get(pid) for pid in wanted}
+
+    def invalidate(self, person_uuids: List[str]) -> Dict[str, str]:
+        """
+        Forgets cached entries pointing at the given people.id values.
+        Returns {stale people.id: planning_center_id}.
+        """
+        targets = set(person_uuids)
+        with self.lock:
+            stale = {uid: pid for pid, uid in self.cache.items() if uid in targets}
+            for pid in stale.values():
+                del self.cache[pid]
+            if self.db and stale:
+                with self.db:
+                    self.db.executemany(
+                        "delete from people_cache where planning_center_id = ?", [(pid,) for pid in stale.values()]
+                    )
+            return stale
+
+    def _remember(self, mapping: Dict[str, str]) -> None:
+        self.cache.update(mapping)
+        if self.db and mapping:
+            now = time.time()
+            with self.db:
+                self.db.executemany(
+                    "insert or replace into people_cache values (?, ?, ?)",
+                    [(pid, uid, now) for pid, uid in mapping.items()],
+                )
+
+    def _new_people(
+        self,
+        person_ids: List[str],
+        found: Dict[str, str],
+        people_lookup: Dict[str, Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Caches the lookup result and returns rows for the people to insert.
+        Ids PCO did not include can't be inserted and are cached as None.
+        """
+        self._remember(found)
+        new_people = []
+        for pid in person_ids:
+            if pid in found:
+                continue
+            if pid in people_lookup:
+                new_people.append(map_person(pid, people_lookup[pid]))
+            else:
+                self.cache[pid] = None
+        return new_people
+
+    def _remember_inserted(self, inserted: List[Dict[str, Any]], new_people: List[Dict[str, Any]]) -> List[str]:
+        """
+        Caches the inserted rows and returns the ids still unresolved.
+        ignore_duplicates keeps an existing row's id if someone else inserted
+        the person since the lookup; those rows are not returned, so they must
+        be re-read.
+        """
+        self._remember({row["planning_center_id"]: row["id"] for row in inserted})
+        return [p["planning_center_id"] for p in new_people if p["planning_center_id"] not in self.cache]
+
+    def _lookup(self, person_ids: List[str]) -> Dict[str, str]:
+        existing = people_select(supabase, person_ids).execute()
+        return {row["planning_center_id"]: row["id"] for row in existing.data or []}
+
+    def _load(self, person_ids: List[str], people_lookup: Dict[str, Dict[str, Any]]) -> None:
+        new_people = self._new_people(person_ids, self._lookup(person_ids), people_lookup)
+        if not new_people:
+            return
+
+        inserted = people_insert(supabase, new_people).execute()
+        leftover = self._remember_inserted(inserted.data or [], new_people)
+        if leftover:
+            self._remember(self._lookup(leftover))
+
+
+def build_submission_row(
     submission_id: str,
     created_at_str: str,
     person_uuid: Optional[str],
     answers: Dict[str, Any],
-) -> None:
-    row = {
+) -> Dict[str, Any]:
+    return {
         "submission_id": submission_id,
         "person_id": person_uuid,
-        "submission_date": answers.get("submission_date"),
-        "service_time": answers.get("service_time"),
-        "attendance_status": answers.get("attendance_status"),
-        "welcome_note": answers.get("welcome_note"),
-        "prayer_request": answers.get("prayer_request"),
-        "phone_number": answers.get("phone_number"),
+        **answers,
         "created_at": created_at_str,
     }
 
-    supabase.table("submissions").upsert(
-        row,
-        on_conflict="submission_id",
-    ).execute()
+
+def upsert_submissions(table: str, rows: List[Dict[str, Any]]) -> Dict[str, Exception]:
+    """
+    Writes rows with one list upsert. If the batch is rejected, retries row by
+    row so only the offending rows fail. Returns {submission_id: error}.
+    """
+    if not rows:
+        return {}
+
+    try:
+        submissions_upsert(supabase, table, rows).execute()
+        return {}
+    except Exception as e:
+        print(f"Batch upsert of {len(rows)} submissions failed ({e}); retrying row by row")
+
+    failed: Dict[str, Exception] = {}
+    for row in rows:
+        try:
+            submissions_upsert(supabase, table, row).execute()
+        except Exception as e:
+            failed[row["submission_id"]] = e
+    return failed
 
 
 # -----------------------------
-# MAIN
+# CHECKPOINT
 # -----------------------------
-def main() -> None:
+# The newest submission ingested is kept in Supabase, with a count of failed
+# runs for each submission holding the checkpoint back:
+#
+#   create table sync_state (
+#       key text primary key,
+#       last_created_at timestamptz,
+#       last_submission_id text,
+#       failed_attempts jsonb not null default '{}',
+#       updated_at timestamptz default now()
+#   );
+#
+#   -- existing tables:
+#   alter table sync_state add column failed_attempts jsonb not null default '{}';
+#
+# people_insert upserts on planning_center_id, which PostgREST only accepts
+# with a unique constraint on that column (error 42P10 otherwise):
+#
+#   alter table people add constraint people_planning_center_id_key unique (planning_center_id);
+def load_checkpoint(key: str) -> Optional[Dict[str, Any]]:
+    result = (
+        supabase.table("sync_state")
+        .select("last_created_at,last_submission_id,failed_attempts")
+        .eq("key", key)
+        .limit(1)
+        .execute()
+    )
+    return result.data[0] if result.data else None
+
+
+def save_checkpoint(key: str, newest: Optional[Tuple[str, str]], failed_attempts: Dict[str, int]) -> None:
+    row: Dict[str, Any] = {
+        "key": key,
+        "failed_attempts": failed_attempts,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if newest:
+        row["last_created_at"], row["last_submission_id"] = newest
+    supabase.table("sync_state").upsert(row, on_conflict="key").execute()
+
+
+def advance_checkpoint(
+    results: List[Tuple[str, str, bool]],
+    failed_attempts: Dict[str, int],
+    log=print,
+) -> Tuple[Optional[Tuple[str, str]], Dict[str, int]]:
+    """
+    Given (created_at, submission_id, ok) for every row this run touched and
+    the failure counts from earlier runs, returns (newest (created_at,
+    submission_id) below which every row succeeded or was given up on, failure
+    counts still holding the checkpoint back). A failed row is picked up again
+    next run until it has failed MAX_SUBMISSION_ATTEMPTS times.
+    """
+    # Counts carry over only for rows that failed again; anything else is gone.
+    attempts = {sid: failed_attempts.get(sid, 0) + 1 for _, sid, ok in results if not ok}
+
+    newest = None
+    for created_at_str, submission_id, ok in sorted(
+        results, key=lambda r: (parse_pco_datetime(r[0]) or datetime.min.replace(tzinfo=timezone.utc), r[1])
+    ):
+        if not ok:
+            if attempts[submission_id] < MAX_SUBMISSION_ATTEMPTS:
+                break
+            log(
+                f"🚨 Giving up on submission {submission_id} (created {created_at_str}) after "
+                f"{attempts[submission_id]} failed runs; the checkpoint moves past it. Ingest it by hand."
+            )
+            del attempts[submission_id]
+        newest = (created_at_str, submission_id)
+    return newest, attempts
+
+
+def last_sunday_cutoff() -> datetime:
+    """
+    Last Sunday 3 PM Chicago, used as the starting point before a checkpoint exists.
+    """
     chicago_tz = ZoneInfo("America/Chicago")
     now_local = datetime.now(chicago_tz)
 
@@ -180,100 +437,304 @@ def main() -> None:
     if now_local.weekday() == 6 and now_local < last_sunday_local:
         last_sunday_local = last_sunday_local - timedelta(days=7)
 
-    cutoff = last_sunday_local.astimezone(timezone.utc)
+    print(f"Last Sunday 3 PM Chicago cutoff: {last_sunday_local.isoformat()}")
+    return last_sunday_local.astimezone(timezone.utc)
 
-    print(f"Starting connection card sync for the most recent {MAX_PAGES} pages...")
-    print(f"Last Sunday 3 PM Chicago cutoff: {last_sunday_local.isoformat()} | UTC: {cutoff.isoformat()}")
 
-    base_url = f"https://api.planningcenteronline.com/people/v2/forms/{FORM_ID}/form_submissions"
-    people_cache: Dict[str, Optional[str]] = {}
+# -----------------------------
+# INGEST
+# -----------------------------
+def index_included(
+    included: List[Dict[str, Any]],
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Splits a page's included resources into (people_lookup, values_lookup).
+    """
+    people_lookup = {
+        item["id"]: item.get("attributes", {})
+        for item in included
+        if item.get("type") == "Person"
+    }
+    values_lookup = {
+        item["id"]: item
+        for item in included
+        if item.get("type") == "FormSubmissionValue"
+    }
+    return people_lookup, values_lookup
+
+
+def build_page_rows(
+    submissions: List[Dict[str, Any]],
+    page_values: List[Tuple[Optional[Dict[str, Any]], Optional[Exception]]],
+    person_uuids: Dict[str, Optional[str]],
+    log=print,
+) -> Tuple[List[Dict[str, Any]], List[Tuple[str, str, bool]]]:
+    """
+    Returns (rows to upsert, failed results) for submissions whose answers
+    could or could not be fetched.
+    """
+    rows = []
+    failures = []
+    for sub, (answers, fetch_error) in zip(submissions, page_values):
+        created_at_str = sub.get("attributes", {}).get("created_at")
+        if fetch_error:
+            log(f"Skipping submission {sub['id']}: {fetch_error}")
+            failures.append((created_at_str, sub["id"], False))
+            continue
+        person_id_ref = submission_person_id(sub)
+        person_uuid = person_uuids.get(person_id_ref) if person_id_ref else None
+        rows.append(build_submission_row(sub["id"], created_at_str, person_uuid, answers))
+    return rows, failures
+
+
+def ingest_submissions(
+    form_id: str,
+    submissions: List[Dict[str, Any]],
+    included: List[Dict[str, Any]],
+    people: PeopleResolver,
+    log=print,
+) -> List[Tuple[str, str, bool]]:
+    """
+    Maps and upserts a batch of submissions of one form, oldest first.
+    Returns (created_at, submission_id, ok) for each of them.
+    """
+    form = FORMS[form_id]
+    people_lookup, values_lookup = index_included(included)
+
+    submissions = sorted(submissions, key=lambda s: s.get("attributes", {}).get("created_at") or "")
+    page_values = [(included_answers(sub, values_lookup, form["fields"]), None) for sub in submissions]
+    # Fall back to one request per submission only where values were not included.
+    missing = [i for i, (answers, _) in enumerate(page_values) if answers is None]
+    if missing:
+        log(f"Fetching values for {len(missing)} submissions not covered by the include")
+        fetched = fetch_page_values(form_id, [submissions[i]["id"] for i in missing])
+        for i, result in zip(missing, fetched):
+            page_values[i] = result
 
-    total_seen = 0
-    total_upserted = 0
-    total_skipped_old = 0
+    try:
+        person_uuids = people.resolve([submission_person_id(sub) for sub in submissions], people_lookup)
+    except Exception as e:
+        log(f"Skipping {len(submissions)} submissions: could not resolve people: {e}")
+        return [(sub.get("attributes", {}).get("created_at"), sub["id"], False) for sub in submissions]
+
+    rows, results = build_page_rows(submissions, page_values, person_uuids, log)
+
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[i : i + UPSERT_BATCH_SIZE]
+        failed = upsert_submissions(form["table"], batch)
+        if failed:
+            failed = retry_stale_people(form["table"], batch, failed, people, people_lookup)
+        for submission_id, e in failed.items():
+            log(f"Skipping submission {submission_id}: {e}")
+        results.extend(
+            (row["created_at"], row["submission_id"], row["submission_id"] not in failed)
+            for row in batch
+        )
 
-    for page_num in range(1, MAX_PAGES + 1):
-        offset = (page_num - 1) * PER_PAGE
-        params = {
-            "order": "-created_at",
-            "per_page": PER_PAGE,
-            "offset": offset,
-            "include": "person",
-        }
+    return results
 
-        print(f"\n--- Page {page_num} ---")
-        print(f"Using offset={offset}")
 
-        response = requests.get(base_url, auth=auth, params=params, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        payload = response.json()
+# Postgres foreign_key_violation, surfaced as postgrest's APIError.code.
+FOREIGN_KEY_VIOLATION = "23503"
 
-        submissions = payload.get("data", [])
-        included = payload.get("included", [])
 
-        if not submissions:
-            print("No submissions returned; stopping.")
-            break
+def stale_person_rows(batch: List[Dict[str, Any]], failed: Dict[str, Exception]) -> List[Dict[str, Any]]:
+    return [
+        row for row in batch
+        if row["submission_id"] in failed
+        and row["person_id"]
+        and getattr(failed[row["submission_id"]], "code", None) == FOREIGN_KEY_VIOLATION
+    ]
 
-        people_lookup = {
-            item["id"]: item.get("attributes", {})
-            for item in included
-            if item.get("type") == "Person"
-        }
 
-        print(f"Fetched {len(submissions)} submissions")
+def remap_stale_rows(
+    stale_rows: List[Dict[str, Any]],
+    stale: Dict[str, str],
+    fresh: Dict[str, Optional[str]],
+    failed: Dict[str, Exception],
+) -> Tuple[List[Dict[str, Any]], Dict[str, Exception]]:
+    """
+    Points stale rows at the re-resolved people.id. Returns (rows worth
+    retrying, failures that stand).
+    """
+    retried = []
+    for row in stale_rows:
+        new_uuid = fresh.get(stale.get(row["person_id"]))
+        if new_uuid and new_uuid != row["person_id"]:
+            retried.append({**row, "person_id": new_uuid})
 
-        first_attrs = submissions[0].get("attributes", {})
-        last_attrs = submissions[-1].get("attributes", {})
-        print(
-            f"PAGE {page_num} RANGE: "
-            f"first_created_at={first_attrs.get('created_at')} | "
-            f"last_created_at={last_attrs.get('created_at')}"
-        )
+    retried_ids = {row["submission_id"] for row in retried}
+    return retried, {k: v for k, v in failed.items() if k not in retried_ids}
 
-        page_had_recent_rows = False
 
-        for sub in submissions:
-            submission_id = sub["id"]
-            created_at_str = sub.get("attributes", {}).get("created_at")
-            created_at_dt = parse_pco_datetime(created_at_str)
+def retry_stale_people(
+    table: str,
+    batch: List[Dict[str, Any]],
+    failed: Dict[str, Exception],
+    people: PeopleResolver,
+    people_lookup: Dict[str, Dict[str, Any]],
+) -> Dict[str, Exception]:
+    """
+    Rows rejected by the person_id foreign key (23503) point at a cached
+    person that was deleted or merged: drop those cache entries, resolve the
+    people again and retry the rows once.
+    """
+    stale_rows = stale_person_rows(batch, failed)
+    if not stale_rows:
+        return failed
+
+    stale = people.invalidate([row["person_id"] for row in stale_rows])
+    fresh = people.resolve(list(stale.values()), people_lookup)
+    retried, remaining = remap_stale_rows(stale_rows, stale, fresh, failed)
+    remaining.update(upsert_submissions(table, retried))
+    return remaining
+
+
+def form_cutoff(sync_state_key: str, log=print) -> Tuple[datetime, Optional[str], Dict[str, int]]:
+    """
+    Returns (cutoff, checkpoint submission id, failure counts) to resume a form from.
+    """
+    checkpoint = load_checkpoint(sync_state_key) or {}
+    failed_attempts = checkpoint.get("failed_attempts") or {}
+    if failed_attempts:
+        log(f"{len(failed_attempts)} submissions failed in earlier runs and will be retried")
+    if checkpoint.get("last_created_at"):
+        cutoff = parse_pco_datetime(checkpoint["last_created_at"])
+        checkpoint_id = checkpoint.get("last_submission_id")
+        log(f"Resuming after submission {checkpoint_id} created {cutoff.isoformat()}")
+        return cutoff, checkpoint_id, failed_attempts
+
+    log("No checkpoint yet; starting from the weekly cutoff.")
+    return last_sunday_cutoff(), None, failed_attempts
+
+
+def submissions_page_params(page_num: int) -> Dict[str, Any]:
+    return {
+        "order": "-created_at",
+        "per_page": PER_PAGE,
+        "offset": (page_num - 1) * PER_PAGE,
+        "include": "person,form_submission_values",
+    }
 
-            total_seen += 1
 
-            if created_at_dt and created_at_dt < cutoff:
-                total_skipped_old += 1
-                continue
+def split_recent(
+    submissions: List[Dict[str, Any]],
+    cutoff: datetime,
+    checkpoint_id: Optional[str],
+) -> List[Dict[str, Any]]:
+    """
+    Drops submissions at or before the checkpoint.
+    """
+    recent = []
+    for sub in submissions:
+        created_at_dt = parse_pco_datetime(sub.get("attributes", {}).get("created_at"))
+        if created_at_dt and (
+            created_at_dt < cutoff
+            or (created_at_dt == cutoff and sub["id"] == checkpoint_id)
+        ):
+            continue
+        recent.append(sub)
+    return recent
+
+
+def log_page(log, page_num: int, submissions: List[Dict[str, Any]]) -> None:
+    first_attrs = submissions[0].get("attributes", {})
+    last_attrs = submissions[-1].get("attributes", {})
+    log(
+        f"Page {page_num}: fetched {len(submissions)} submissions: "
+        f"first_created_at={first_attrs.get('created_at')} | "
+        f"last_created_at={last_attrs.get('created_at')}"
+    )
 
-            page_had_recent_rows = True
 
-            person_rel = (
-                sub.get("relationships", {})
-                .get("person", {})
-                .get("data")
-            )
-            person_id_ref = person_rel.get("id") if person_rel else None
+def sync_form(form_id: str, people: PeopleResolver) -> Dict[str, int]:
+    form = FORMS[form_id]
+    sync_state_key = f"connection_cards:{form_id}"
+
+    def log(message: str) -> None:
+        print(f"[{form['name']}] {message}")
+
+    cutoff, checkpoint_id, failed_attempts = form_cutoff(sync_state_key, log)
+    log(f"Starting connection card sync from {cutoff.isoformat()} UTC...")
 
-            try:
-                answers = fetch_submission_values(submission_id)
-                person_uuid = find_or_create_person(person_id_ref, people_lookup, people_cache)
-                upsert_submission(submission_id, created_at_str, person_uuid, answers)
-                total_upserted += 1
-            except Exception as e:
-                print(f"Skipping submission {submission_id}: {e}")
+    base_url = f"{PCO_FORMS_URL}/{form_id}/form_submissions"
 
-            time.sleep(0.05)
+    total_seen = 0
+    total_skipped_old = 0
+    results: List[Tuple[str, str, bool]] = []
 
-        if not page_had_recent_rows:
-            print(f"Stopping early: page {page_num} is entirely older than the cutoff.")
+    for page_num in itertools.count(1):
+        payload = pco_get(base_url, submissions_page_params(page_num))
+
+        submissions = payload.get("data", [])
+        included = payload.get("included", [])
+
+        if not submissions:
+            log("No submissions returned; stopping.")
             break
 
-        time.sleep(0.2)
+        log_page(log, page_num, submissions)
+
+        recent = split_recent(submissions, cutoff, checkpoint_id)
+        total_seen += len(submissions)
+        total_skipped_old += len(submissions) - len(recent)
 
+        if not recent:
+            log(f"Stopping early: page {page_num} is entirely older than the cutoff.")
+            break
+
+        results.extend(ingest_submissions(form_id, recent, included, people, log))
+
+    newest, still_failing = advance_checkpoint(results, failed_attempts, log)
+    if newest or still_failing != failed_attempts:
+        save_checkpoint(sync_state_key, newest, still_failing)
+    if newest:
+        log(f"Checkpoint advanced to submission {newest[1]} created {newest[0]}")
+
+    return {
+        "seen": total_seen,
+        "upserted": sum(1 for _, _, ok in results if ok),
+        "skipped_old": total_skipped_old,
+    }
+
+
+def print_summary(stats: Dict[str, Dict[str, int]]) -> None:
     print("\n✅ Sync complete")
-    print(f"Submissions seen: {total_seen}")
-    print(f"Submissions upserted: {total_upserted}")
-    print(f"Submissions skipped as older than cutoff: {total_skipped_old}")
+    for form_id, form_stats in stats.items():
+        print(f"{FORMS[form_id]['name']} ({form_id}):")
+        print(f"  Submissions seen: {form_stats['seen']}")
+        print(f"  Submissions upserted: {form_stats['upserted']}")
+        print(f"  Submissions skipped as already synced: {form_stats['skipped_old']}")
+
+
+# -----------------------------
+# MAIN
+# -----------------------------
+def main() -> None:
+    # Forms run side by side on the shared session, PCO limiter and people resolver.
+    people = PeopleResolver()
+    with ThreadPoolExecutor(max_workers=len(FORMS)) as pool:
+        stats = dict(zip(FORMS, pool.map(lambda form_id: sync_form(form_id, people), FORMS)))
+    print_summary(stats)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Sync PCO connection card submissions into Supabase.")
+    ap.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default=os.getenv("CC_ENGINE", "threads"),
+        help="threads: requests + thread pools; async: the asyncio pipeline in cc_async_engine",
+    )
+    args = ap.parse_args()
+
+    if args.engine == "async":
+        # Run as a script this module is __main__. Register it under its own
+        # name too, so cc_async_engine's import reuses it instead of running
+        # the file again with a second Supabase client and PCO session.
+        sys.modules.setdefault("CCsubmission_import", sys.modules[__name__])
+        import cc_async_engine
+
+        cc_async_engine.main()
+    else:
+        main()
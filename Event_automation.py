@@ -1,16 +1,66 @@
+import functools
+import hashlib
+import json
+import queue
+import re
+import threading
 import requests
-from datetime import datetime, timezone
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from dateutil import parser
 from html.parser import HTMLParser
 from slugify import slugify
 
+from pco_rate_limit import pco_limiter
+
 import os
 
 PCO_APP_ID = os.environ["PCO_APP_ID"]
 PCO_SECRET = os.environ["PCO_SECRET"]
 WEBFLOW_TOKEN = os.environ["WEBFLOW_TOKEN"]
 COLLECTION_ID = os.environ["COLLECTION_ID"]
-WEBFLOW_API_BASE = "https://api.webflow.com/v2"
+# Overridable so bench_event_automation.py can point the sync at local fakes.
+WEBFLOW_API_BASE = os.getenv("WEBFLOW_API_BASE", "https://api.webflow.com/v2")
+PCO_API_BASE = os.getenv("PCO_API_BASE", "https://api.planningcenteronline.com")
+
+# "compound" pulls instances with their events included in one paged listing;
+# "per_event" is the old events list + one event_instances call per event.
+PCO_FETCH_MODE = os.getenv("PCO_FETCH_MODE", "compound")
+# How many PCO pages a background thread may fetch ahead of the sync loop.
+PCO_PREFETCH_PAGES = int(os.getenv("PCO_PREFETCH_PAGES", "1"))
+
+# Events synced in parallel, plus separate caps on requests in flight per host.
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "1"))
+PCO_MAX_IN_FLIGHT = int(os.getenv("PCO_MAX_IN_FLIGHT", "4"))
+WEBFLOW_MAX_IN_FLIGHT = int(os.getenv("WEBFLOW_MAX_IN_FLIGHT", "2"))
+
+# Optional Webflow field slug that stores the PCO event id. When set, items are
+# matched on it before falling back to the slug, and new items get it written.
+PCO_ID_FIELD = os.getenv("WEBFLOW_PCO_ID_FIELD", "")
+
+# "incremental" only looks at events/instances PCO changed since the stored
+# checkpoint, falling back to a full pass every FULL_SYNC_INTERVAL_HOURS;
+# "full" always re-derives the whole future calendar.
+SYNC_MODE = os.getenv("SYNC_MODE", "incremental")
+FULL_SYNC_INTERVAL_HOURS = float(os.getenv("FULL_SYNC_INTERVAL_HOURS", "24"))
+# Runner clock vs PCO clock slack applied to full-run checkpoints.
+CHECKPOINT_SKEW = timedelta(minutes=5)
+
+# What to do with Webflow items that no current PCO event matched (past,
+# deleted or hidden events) after a full sync: "report" only lists them,
+# "archive" unpublishes and archives them, "delete" removes them, "off" skips.
+PRUNE_MODE = os.getenv("PRUNE_MODE", "report")
+
+# Items per bulk create / update call (Webflow allows up to 100).
+WEBFLOW_BATCH_SIZE = int(os.getenv("WEBFLOW_BATCH_SIZE", "100"))
+
+# Local JSON state (content hashes of what was last written per item id).
+# The workflow keeps it between runs with actions/cache.
+STATE_FILE = os.getenv("EVENT_SYNC_STATE_FILE", ".event_sync_state.json")
+# Optional hidden Webflow field that stores the hash on the item itself, which
+# survives a lost state file.
+HASH_FIELD = os.getenv("WEBFLOW_HASH_FIELD", "")
 
 # ==== HEADERS ====
 webflow_headers = {
@@ -19,16 +69,45 @@ webflow_headers = {
     "accept-version": "2.0.0"
 }
 
+pco_slots = threading.BoundedSemaphore(PCO_MAX_IN_FLIGHT)
+webflow_slots = threading.BoundedSemaphore(WEBFLOW_MAX_IN_FLIGHT)
+
+# ==== HTTP ====
+def pco_get(url, params=None):
+    with pco_slots:
+        res = pco_limiter.request(lambda: requests.get(url, auth=(PCO_APP_ID, PCO_SECRET), params=params))
+    res.raise_for_status()
+    return res.json()
+
+def webflow_request(method, url, **kwargs):
+    with webflow_slots:
+        return requests.request(method, url, headers=webflow_headers, **kwargs)
+
 # ==== HELPERS ====
 class CleanHTMLParser(HTMLParser):
-    def __init__(self):
-        super().__init__()
+    """
+    Flattens PCO description HTML to plain text in one pass: links keep their
+    target in parentheses, block tags become blank lines, list items become
+    bullets, inline tags (strong, em, span...) just pass their text through
+    and entities are decoded by HTMLParser itself. reset() readies the same
+    instance for the next description.
+    """
+
+    BLOCK_TAGS = {"p", "div", "ul", "ol", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+    def reset(self):
+        # HTMLParser.__init__ calls reset(), so this also initialises the buffers.
+        super().reset()
         self.result = []
         self.href = None
 
     def handle_starttag(self, tag, attrs):
         if tag == "br":
             self.result.append("\n")
+        elif tag == "li":
+            self.result.append("\n• ")
+        elif tag in self.BLOCK_TAGS:
+            self.result.append("\n\n")
         elif tag == "a":
             for attr in attrs:
                 if attr[0] == "href":
@@ -38,92 +117,552 @@ class CleanHTMLParser(HTMLParser):
         if tag == "a" and self.href:
             self.result.append(f" ({self.href})")
             self.href = None
+        elif tag in self.BLOCK_TAGS:
+            self.result.append("\n\n")
 
     def handle_data(self, data):
         self.result.append(data)
 
     def get_data(self):
-        return ''.join(self.result).strip()
+        text = "".join(self.result).replace("\xa0", " ")
+        text = re.sub(r"[ \t]+\n", "\n", text)
+        return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+_parsers = threading.local()
 
 def clean_description(html_text):
     if not html_text:
         return "—"
-    parser = CleanHTMLParser()
-    parser.feed(html_text)
-    return parser.get_data()
+    return _clean_html(html_text)
+
+@functools.lru_cache(maxsize=2048)
+def _clean_html(html_text):
+    # Descriptions rarely change between runs (or between instances of a
+    # recurring event), so results are memoised on the raw HTML. Each worker
+    # thread keeps one parser and resets it rather than building a new one.
+    html_parser = getattr(_parsers, "parser", None)
+    if html_parser is None:
+        html_parser = _parsers.parser = CleanHTMLParser()
+    html_parser.reset()
+    html_parser.feed(html_text)
+    html_parser.close()
+    return html_parser.get_data()
+
+def load_state():
+    try:
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_state(state):
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, STATE_FILE)
+
+def field_data_hash(field_data):
+    blob = json.dumps(field_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def stored_hash(item, hashes):
+    if HASH_FIELD:
+        return (item.get("fieldData") or {}).get(HASH_FIELD)
+    return hashes.get(item["id"])
 
 def build_slug(name, starts_at):
     date_part = starts_at.split("T")[0]  # "YYYY-MM-DD"
     return slugify(f"{name}-{date_part}")
 
-def get_webflow_item_by_slug(slug):
+def fetch_webflow_items():
+    """
+    Page through the whole events collection once (Webflow caps a page at 100 items).
+    """
     url = f"{WEBFLOW_API_BASE}/collections/{COLLECTION_ID}/items"
-    res = requests.get(url, headers=webflow_headers)
-    res.raise_for_status()
-    for item in res.json().get("items", []):
-        if item["fieldData"]["slug"] == slug:
-            return item
-    return None
+    limit = 100
+    items = []
+    offset = 0
+    while True:
+        res = webflow_request("GET", url, params={"limit": limit, "offset": offset})
+        res.raise_for_status()
+        batch = res.json().get("items", []) or []
+        items.extend(batch)
+        offset += len(batch)
+        # A short page is the last one; pagination.total is not always present.
+        if len(batch) < limit:
+            break
+    return items
 
-def fetch_visible_pco_events():
-    url = "https://api.planningcenteronline.com/calendar/v2/events?filter=future&per_page=100"
-    res = requests.get(url, auth=(PCO_APP_ID, PCO_SECRET))
-    res.raise_for_status()
-    events = res.json().get("data", [])
-    return [e for e in events if e["attributes"]["visible_in_church_center"]]
+def build_webflow_index(items):
+    """
+    Returns {"slug": {slug: item}, "pco_id": {pco event id: item}} for O(1) lookups,
+    plus "seen", the ids of existing items an event matched during this run.
+    """
+    index = {"slug": {}, "pco_id": {}, "seen": set()}
+    for item in items:
+        add_to_index(index, item)
+    return index
+
+def add_to_index(index, item):
+    field_data = item.get("fieldData") or {}
+    if field_data.get("slug"):
+        index["slug"][field_data["slug"]] = item
+    if PCO_ID_FIELD and field_data.get(PCO_ID_FIELD):
+        index["pco_id"][str(field_data[PCO_ID_FIELD])] = item
+
+def find_indexed_item(index, event_id, slug):
+    if PCO_ID_FIELD and event_id in index["pco_id"]:
+        return index["pco_id"][event_id]
+    return index["slug"].get(slug)
+
+def _fetch_pco_pages(url, params=None):
+    while url:
+        data = pco_get(url, params)
+        yield data
+        # links.next already carries the query string
+        url = (data.get("links") or {}).get("next")
+        params = None
+
+def iter_pco_pages(url, params=None, prefetch=None):
+    """
+    Yields PCO JSON:API pages, following links.next. Up to `prefetch` pages are
+    fetched ahead on a background thread so page N is processed while N+1 downloads;
+    the bounded queue keeps memory flat however long the calendar is.
+    """
+    prefetch = PCO_PREFETCH_PAGES if prefetch is None else prefetch
+    if prefetch <= 0:
+        yield from _fetch_pco_pages(url, params)
+        return
+
+    pages = queue.Queue(maxsize=prefetch)
+    done = object()
+
+    def produce():
+        try:
+            for page in _fetch_pco_pages(url, params):
+                pages.put(page)
+        except Exception as e:
+            pages.put(e)
+        else:
+            pages.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        page = pages.get()
+        if page is done:
+            return
+        if isinstance(page, Exception):
+            raise page
+        yield page
+
+def iter_visible_pco_events():
+    url = f"{PCO_API_BASE}/calendar/v2/events"
+    for page in iter_pco_pages(url, {"filter": "future", "per_page": 100}):
+        for event in page.get("data", []):
+            if event["attributes"]["visible_in_church_center"]:
+                yield event
 
 def fetch_first_instance(event_id):
-    url = f"https://api.planningcenteronline.com/calendar/v2/events/{event_id}/event_instances"
-    res = requests.get(url, auth=(PCO_APP_ID, PCO_SECRET))
-    res.raise_for_status()
+    url = f"{PCO_API_BASE}/calendar/v2/events/{event_id}/event_instances"
+    data = pco_get(url)
     now = datetime.now(timezone.utc)
-    for inst in res.json().get("data", []):
+    for inst in data.get("data", []):
         starts_at = parser.isoparse(inst["attributes"]["starts_at"])
         if starts_at > now:
             return inst["attributes"]
     return None
 
-def create_or_update_item(event, instance, slug):
-    payload = {
-        "fieldData": {
-            "name": event["attributes"]["name"],
-            "slug": slug,
-            "start-date-time": instance["starts_at"],
-            "end-date-time": instance["ends_at"],
-            "location": instance.get("location") or "",
-            "description": clean_description(event["attributes"].get("description", "")),
-            "short-description": event["attributes"].get("summary", ""),
-            "image": event["attributes"].get("image_url", ""),
-            "rsvp-link": instance.get("church_center_url", ""),
-        }
+def iter_events_with_first_instance():
+    """
+    Lists future event instances in start order with their events side-loaded via
+    include=event, so the first instance seen for an event is its next occurrence.
+    Yields (event, instance_attributes) for events visible in Church Center.
+    """
+    url = f"{PCO_API_BASE}/calendar/v2/event_instances"
+    params = {"filter": "future", "include": "event", "order": "starts_at", "per_page": 100}
+    now = datetime.now(timezone.utc)
+    seen = set()
+    for page in iter_pco_pages(url, params):
+        events = {e["id"]: e for e in page.get("included", []) if e.get("type") == "Event"}
+        for inst in page.get("data", []):
+            event_ref = inst.get("relationships", {}).get("event", {}).get("data") or {}
+            event = events.get(event_ref.get("id"))
+            if not event or event["id"] in seen:
+                continue
+            if not event["attributes"]["visible_in_church_center"]:
+                seen.add(event["id"])
+                continue
+            if parser.isoparse(inst["attributes"]["starts_at"]) <= now:
+                continue
+            seen.add(event["id"])
+            yield event, inst["attributes"]
+
+class WebflowStager:
+    """
+    Buffers creates and updates and writes them with Webflow's bulk live item
+    endpoints, WEBFLOW_BATCH_SIZE items per call. Each item's outcome is
+    recorded in self.results as (order, status, log line), order being the
+    event's position in the PCO listing. Items are staged from the main thread
+    in PCO order, after create_or_update_item has dropped duplicates.
+    """
+
+    def __init__(self, index, hashes, batch_size=WEBFLOW_BATCH_SIZE):
+        self.index = index
+        self.hashes = hashes
+        self.batch_size = batch_size
+        self.creates = {}  # slug -> entry
+        self.updates = {}  # item id -> entry
+        self.results = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def stage(self, item_id, field_data, content_hash, order):
+        with self.lock:
+            entry = {"order": order, "field_data": field_data, "hash": content_hash}
+            if item_id:
+                entry["id"] = item_id
+                self.updates[item_id] = entry
+                full = len(self.updates) >= self.batch_size
+            else:
+                self.creates[field_data["slug"]] = entry
+                full = len(self.creates) >= self.batch_size
+            batches = self._take(full_only=True) if full else []
+        for method, batch in batches:
+            self._write(method, batch)
+
+    def flush(self):
+        with self.lock:
+            batches = self._take(full_only=False)
+        for method, batch in batches:
+            self._write(method, batch)
+
+    def _take(self, full_only):
+        batches = []
+        for method, pending in (("POST", self.creates), ("PATCH", self.updates)):
+            if pending and (not full_only or len(pending) >= self.batch_size):
+                entries = list(pending.values())
+                pending.clear()
+                for i in range(0, len(entries), self.batch_size):
+                    batches.append((method, entries[i : i + self.batch_size]))
+        return batches
+
+    def _write(self, method, entries):
+        url = f"{WEBFLOW_API_BASE}/collections/{COLLECTION_ID}/items/live?skipInvalidFiles=true"
+        items = []
+        for entry in entries:
+            item = {"fieldData": entry["field_data"], "isDraft": False, "isArchived": False}
+            if "id" in entry:
+                item["id"] = entry["id"]
+            items.append(item)
+
+        res = webflow_request(method, url, json={"items": items})
+        self.calls += 1
+
+        if res.status_code in [200, 201, 202]:
+            self._record_success(method, entries, res.json().get("items", []) or [])
+            return
+
+        # A batch rejected by validation fails as a whole. Retry without the items
+        # the error names (items[N]...), or split it in half until the bad item is
+        # alone. Other errors (auth, missing collection) would fail every half too.
+        if len(entries) > 1 and res.status_code in (400, 422):
+            bad = {int(i) for i in re.findall(r"items\[(\d+)\]", res.text)}
+            bad = {i for i in bad if i < len(entries)}
+            if bad and len(bad) < len(entries):
+                for i in sorted(bad):
+                    self._record_failure(method, entries[i], res)
+                self._write(method, [e for i, e in enumerate(entries) if i not in bad])
+            else:
+                middle = len(entries) // 2
+                self._write(method, entries[:middle])
+                self._write(method, entries[middle:])
+            return
+
+        for entry in entries:
+            self._record_failure(method, entry, res)
+
+    def _record_success(self, method, entries, returned):
+        if method == "POST":
+            by_key = {(it.get("fieldData") or {}).get("slug"): it for it in returned}
+        else:
+            by_key = {it.get("id"): it for it in returned}
+
+        for entry in entries:
+            name = entry["field_data"]["name"]
+            key = entry["field_data"]["slug"] if method == "POST" else entry["id"]
+            item = by_key.get(key)
+            if not item:
+                line = f"❌ Failed to {'create' if method == 'POST' else 'update'} {entry['field_data']['slug']}: missing from bulk response"
+                self.results.append((entry["order"], "failed", line))
+                continue
+            self.hashes[item["id"]] = entry["hash"]
+            if method == "POST":
+                # Index the new item so a later event with the same slug updates it.
+                add_to_index(self.index, item)
+                self.results.append((entry["order"], "created", f"✅ Created: {name}"))
+            else:
+                self.results.append((entry["order"], "updated", f"🔁 Updated: {name}"))
+
+    def record_duplicate(self, order, field_data, kept):
+        line = (
+            f"⚠️ Duplicate of {field_data['slug']}: skipped {field_data['name']}, "
+            f"keeping the earlier {kept['name']}"
+        )
+        with self.lock:
+            self.results.append((order, "duplicate", line))
+
+    def _record_failure(self, method, entry, res):
+        action = "create" if method == "POST" else "update"
+        line = f"❌ Failed to {action} {entry['field_data']['slug']}: {res.status_code} - {res.text}"
+        self.results.append((entry["order"], "failed", line))
+
+def fetch_changed_events(since):
+    """
+    Returns (events, high_water): the visible events whose own record or any
+    future instance has updated_at >= since, and the newest updated_at seen.
+    Their next instance is resolved per event later, which is cheap for a
+    handful of changes.
+    """
+    where = {"where[updated_at][gte]": since, "filter": "future", "per_page": 100}
+    changed = {}
+    high_water = since
+
+    for page in iter_pco_pages(f"{PCO_API_BASE}/calendar/v2/events", where):
+        for event in page.get("data", []):
+            high_water = max(high_water, event["attributes"].get("updated_at") or since)
+            changed[event["id"]] = event
+
+    params = {**where, "include": "event"}
+    for page in iter_pco_pages(f"{PCO_API_BASE}/calendar/v2/event_instances", params):
+        events = {e["id"]: e for e in page.get("included", []) if e.get("type") == "Event"}
+        for inst in page.get("data", []):
+            high_water = max(high_water, inst["attributes"].get("updated_at") or since)
+            event_ref = inst.get("relationships", {}).get("event", {}).get("data") or {}
+            event = events.get(event_ref.get("id"))
+            if event:
+                changed.setdefault(event["id"], event)
+
+    events = [e for e in changed.values() if e["attributes"]["visible_in_church_center"]]
+    return events, high_water
+
+def is_full_sync_due(state):
+    if SYNC_MODE == "full" or not state.get("checkpoint") or not state.get("last_full_sync"):
+        return True
+    last_full = parser.isoparse(state["last_full_sync"])
+    return datetime.now(timezone.utc) - last_full >= timedelta(hours=FULL_SYNC_INTERVAL_HOURS)
+
+def build_field_data(event, instance, slug):
+    """
+    Returns (field_data, content_hash) for one event's Webflow item.
+    """
+    field_data = {
+        "name": event["attributes"]["name"],
+        "slug": slug,
+        "start-date-time": instance["starts_at"],
+        "end-date-time": instance["ends_at"],
+        "location": instance.get("location") or "",
+        "description": clean_description(event["attributes"].get("description", "")),
+        "short-description": event["attributes"].get("summary", ""),
+        "image": event["attributes"].get("image_url", ""),
+        "rsvp-link": instance.get("church_center_url", ""),
     }
+    if PCO_ID_FIELD:
+        field_data[PCO_ID_FIELD] = event["id"]
+    content_hash = field_data_hash(field_data)
+    if HASH_FIELD:
+        field_data[HASH_FIELD] = content_hash
+    return field_data, content_hash
 
-    existing_item = get_webflow_item_by_slug(slug)
+def create_or_update_item(order, event_id, field_data, content_hash, index, hashes, stager, claims):
+    """
+    Stages the Webflow write for one event, skipping it when the content hash
+    matches what was last written. Runs on the main thread in PCO order; the
+    first event to claim a slug or an existing item wins, and later claimants
+    are recorded as duplicates instead of overwriting it every run.
+    Returns "unchanged", "duplicate" or "staged".
+    """
+    slug = field_data["slug"]
+    existing_item = find_indexed_item(index, event_id, slug)
+    keys = [("slug", slug)] + ([("item", existing_item["id"])] if existing_item else [])
+    kept = next((claims[key] for key in keys if key in claims), None)
+    if kept:
+        stager.record_duplicate(order, field_data, kept)
+        return "duplicate"
+    for key in keys:
+        claims[key] = field_data
 
     if existing_item:
-        item_id = existing_item["id"]
-        url = f"{WEBFLOW_API_BASE}/collections/{COLLECTION_ID}/items/{item_id}/live"
-        res = requests.patch(url, headers=webflow_headers, json=payload)
-        if res.status_code in [200, 201]:
-            print(f"🔁 Updated: {payload['fieldData']['name']}")
+        index["seen"].add(existing_item["id"])
+
+    if existing_item and stored_hash(existing_item, hashes) == content_hash:
+        return "unchanged"
+    stager.stage(existing_item["id"] if existing_item else None, field_data, content_hash, order)
+    return "staged"
+
+def is_in_progress(item, now):
+    """
+    True for an item whose event has started but not ended. PCO's future filter
+    and the first-upcoming-instance matching both skip it, so it matches nothing
+    until it is over.
+    """
+    field_data = item.get("fieldData") or {}
+    starts_at = field_data.get("start-date-time")
+    ends_at = field_data.get("end-date-time")
+    return bool(starts_at and ends_at) and parser.isoparse(starts_at) <= now < parser.isoparse(ends_at)
+
+def find_orphans(items, seen_ids, now):
+    """
+    One pass over the collection snapshot: active items no PCO event matched,
+    leaving events that are still running on the site.
+    """
+    return [
+        it for it in items
+        if it["id"] not in seen_ids and not it.get("isArchived") and not is_in_progress(it, now)
+    ]
+
+def describe_orphan(item, now):
+    field_data = item.get("fieldData") or {}
+    ends_at = field_data.get("end-date-time") or field_data.get("start-date-time")
+    reason = "past" if ends_at and parser.isoparse(ends_at) < now else "not in PCO"
+    return f"{field_data.get('name')} ({field_data.get('slug')}, {reason})"
+
+def is_live(item):
+    return not item.get("isDraft") and bool(item.get("lastPublished"))
+
+def prune_items(orphans, mode):
+    """
+    Unpublishes then archives or deletes orphans in 100-item bulk calls.
+    Drafts and never-published items have nothing live to unpublish.
+    """
+    base = f"{WEBFLOW_API_BASE}/collections/{COLLECTION_ID}/items"
+    for i in range(0, len(orphans), 100):
+        batch = orphans[i : i + 100]
+        chunk = [{"id": it["id"]} for it in batch]
+        live = [{"id": it["id"]} for it in batch if is_live(it)]
+        if live:
+            res = webflow_request("DELETE", f"{base}/live", json={"items": live})
+            res.raise_for_status()
+        if mode == "archive":
+            archived = [{**item, "isArchived": True} for item in chunk]
+            res = webflow_request("PATCH", base, json={"items": archived})
         else:
-            print(f"❌ Failed to update {slug}: {res.status_code} - {res.text}")
+            res = webflow_request("DELETE", base, json={"items": chunk})
+        res.raise_for_status()
+        print(f"🧹 {mode.capitalize()}d batch {i // 100 + 1} ({len(chunk)} items)")
+
+def reconcile(items, index, mode):
+    now = datetime.now(timezone.utc)
+    orphans = find_orphans(items, index["seen"], now)
+    if not orphans:
+        print("🧹 No orphaned Webflow items")
+        return
+
+    print(f"🧹 {len(orphans)} Webflow items no longer match a visible future PCO event:")
+    for item in orphans:
+        print(f"- {describe_orphan(item, now)}")
+
+    if mode in ("archive", "delete"):
+        prune_items(orphans, mode)
     else:
-        url = f"{WEBFLOW_API_BASE}/collections/{COLLECTION_ID}/items/live?skipInvalidFiles=true"
-        res = requests.post(url, headers=webflow_headers, json=payload)
-        if res.status_code in [200, 201]:
-            print(f"✅ Created: {payload['fieldData']['name']}")
-        else:
-            print(f"❌ Failed to create {slug}: {res.status_code} - {res.text}")
+        print("PRUNE_MODE=report; nothing removed.")
 
-def run():
-    events = fetch_visible_pco_events()
-    for event in events:
+def sync_event(event, instance):
+    """
+    Prepares one event on a worker: returns (event id, field_data, content_hash),
+    or None when it has no upcoming instance. In per_event mode the instance is
+    fetched here so that call runs on the worker too.
+    """
+    if instance is None:
         instance = fetch_first_instance(event["id"])
-        if not instance:
+    if not instance:
+        return None
+    slug = build_slug(event["attributes"]["name"], instance["starts_at"])
+    return (event["id"], *build_field_data(event, instance, slug))
+
+def map_in_order(fn, arg_tuples, workers):
+    """
+    Runs fn over arg_tuples on a thread pool and yields results in input order.
+    At most 2 * workers calls are queued, so a lazy input is never drained up front.
+    """
+    if workers <= 1:
+        for args in arg_tuples:
+            yield fn(*args)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for args in arg_tuples:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def run():
+    print("🔄 Indexing Webflow events collection...")
+    items = fetch_webflow_items()
+    index = build_webflow_index(items)
+    print(f"✅ Indexed {len(index['slug'])} Webflow items")
+
+    state = load_state()
+    # Only keep hashes for items that still exist in the collection.
+    item_ids = {item["id"] for item in index["slug"].values()}
+    hashes = {k: v for k, v in state.get("hashes", {}).items() if k in item_ids}
+
+    started_at = datetime.now(timezone.utc)
+    full_sync = is_full_sync_due(state)
+    if full_sync:
+        print("🔄 Full sync of future PCO events")
+        if PCO_FETCH_MODE == "per_event":
+            pairs = ((e, None) for e in iter_visible_pco_events())
+        else:
+            pairs = iter_events_with_first_instance()
+    else:
+        print(f"🔄 Incremental sync of PCO changes since {state['checkpoint']}")
+        changed_events, high_water = fetch_changed_events(state["checkpoint"])
+        print(f"Found {len(changed_events)} changed events")
+        pairs = ((e, None) for e in changed_events)
+
+    stager = WebflowStager(index, hashes)
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "duplicate": 0, "failed": 0}
+    # Workers fetch and build items; matching, duplicate checks and writes stay
+    # on this thread in PCO order, so the first event to claim an item wins.
+    claims = {}
+    for order, prepared in enumerate(map_in_order(sync_event, pairs, SYNC_CONCURRENCY)):
+        if prepared is None:
             continue
-        slug = build_slug(event["attributes"]["name"], instance["starts_at"])
-        create_or_update_item(event, instance, slug)
+        status = create_or_update_item(order, *prepared, index, hashes, stager, claims)
+        if status == "unchanged":
+            counts["unchanged"] += 1
+    stager.flush()
+
+    # Lines are printed in PCO order regardless of which batch wrote the item.
+    for _, status, line in sorted(stager.results, key=lambda result: result[0]):
+        counts[status] += 1
+        print(line)
+
+    state["hashes"] = hashes
+    # Advance the checkpoint only when every write landed; otherwise the failed
+    # events are retried next run.
+    if counts["failed"] == 0:
+        if full_sync:
+            # Same format as PCO's updated_at so checkpoints compare as strings.
+            state["checkpoint"] = (started_at - CHECKPOINT_SKEW).strftime("%Y-%m-%dT%H:%M:%SZ")
+            state["last_full_sync"] = started_at.isoformat()
+        else:
+            state["checkpoint"] = high_water
+    save_state(state)
+
+    # Pruning needs the complete PCO picture, so only after a clean full pass
+    # that actually returned events.
+    if PRUNE_MODE != "off" and full_sync and counts["failed"] == 0 and sum(counts.values()):
+        reconcile(items, index, PRUNE_MODE)
+
+    print(
+        f"\n✅ Sync complete: {counts['created']} created, {counts['updated']} updated, "
+        f"{counts['unchanged']} unchanged, {counts['duplicate']} duplicate, {counts['failed']} failed "
+        f"({stager.calls} Webflow write calls)"
+    )
 
 if __name__ == "__main__":
     run()
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark for Event_automation.clean_description.
+
+    python bench_clean_description.py                       # built-in sample corpus
+    python bench_clean_description.py --corpus corpus.json  # JSON list of HTML strings
+    python bench_clean_description.py --dump corpus.json    # save today's PCO descriptions
+                                                            # (needs PCO_APP_ID / PCO_SECRET)
+"""
+import argparse
+import json
+import os
+import time
+
+# Event_automation reads these at import time; only --dump talks to PCO.
+for name in ("PCO_APP_ID", "PCO_SECRET", "WEBFLOW_TOKEN", "COLLECTION_ID"):
+    os.environ.setdefault(name, "bench")
+
+import Event_automation  # noqa: E402
+
+SAMPLE_CORPUS = [
+    "<p>Join us for <strong>Family Night</strong> &amp; dinner!</p><p>Kids welcome.</p>",
+    "<div>Register at <a href=\"https://example.churchcenter.com/registrations\">Church Center</a><br>Questions? Email us.</div>",
+    "<p>What to bring:</p><ul><li>Bible</li><li>Notebook</li><li>A friend&nbsp;or two</li></ul>",
+    "Plain text description with no markup at all.",
+    "<h2>Men&#39;s Breakfast</h2><p><em>Saturday</em> 8&ndash;10am in the fellowship hall.</p>",
+]
+
+
+def dump_corpus(path):
+    descriptions = [
+        e["attributes"].get("description")
+        for e in Event_automation.iter_visible_pco_events()
+    ]
+    descriptions = [d for d in descriptions if d]
+    with open(path, "w") as f:
+        json.dump(descriptions, f, indent=2)
+    print(f"Wrote {len(descriptions)} descriptions to {path}")
+
+
+def time_per_call(fn, corpus, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for html_text in corpus:
+            fn(html_text)
+    return (time.perf_counter() - start) / (rounds * len(corpus))
+
+
+def fresh_parser(html_text):
+    html_parser = Event_automation.CleanHTMLParser()
+    html_parser.feed(html_text)
+    html_parser.close()
+    return html_parser.get_data()
+
+
+def uncached(html_text):
+    Event_automation._clean_html.cache_clear()
+    return Event_automation.clean_description(html_text)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", help="JSON file with a list of description HTML strings")
+    ap.add_argument("--dump", help="fetch current PCO descriptions into this JSON file and exit")
+    ap.add_argument("--rounds", type=int, default=200)
+    args = ap.parse_args()
+
+    if args.dump:
+        dump_corpus(args.dump)
+        return
+
+    corpus = SAMPLE_CORPUS
+    if args.corpus:
+        with open(args.corpus) as f:
+            corpus = json.load(f)
+    if not corpus:
+        raise SystemExit("Corpus is empty.")
+
+    total_bytes = sum(len(d) for d in corpus)
+    print(f"Corpus: {len(corpus)} descriptions, {total_bytes} bytes, {args.rounds} rounds")
+
+    results = {
+        "fresh parser per call": time_per_call(fresh_parser, corpus, args.rounds),
+        "reused parser, cache miss": time_per_call(uncached, corpus, args.rounds),
+        "cache hit": time_per_call(Event_automation.clean_description, corpus, args.rounds),
+    }
+    for label, seconds in results.items():
+        print(f"{label:<28} {seconds * 1e6:10.2f} µs/description")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Offline harness and benchmark for Event_automation.run().
+
+Starts stand-in PCO Calendar and Webflow CMS servers in a child process, points
+Event_automation at them and reports requests issued, wall time and peak
+Python memory for a cold run (empty collection) and a warm rerun.
+
+    python bench_event_automation.py                     # 100 / 1000 / 10000 events
+    python bench_event_automation.py --sizes 500 --concurrency 4
+    python bench_event_automation.py --record pco.json   # save live PCO events (needs creds)
+    python bench_event_automation.py --replay pco.json   # serve a recorded calendar instead
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import requests
+
+COLLECTION_ID = "bench-collection"
+
+
+# ---------------- FAKE DATA ----------------
+def synthetic_calendar(count):
+    """
+    [{"event": ..., "instances": [...]}] shaped like PCO JSON:API resources.
+    Every tenth event is hidden from Church Center and every fifth recurs.
+    """
+    now = datetime.now(timezone.utc)
+    stamp = now.strftime("%Y-%m-%dT%H:%M:%SZ")
+    calendar = []
+    for i in range(count):
+        event_id = str(100000 + i)
+        event = {
+            "type": "Event",
+            "id": event_id,
+            "attributes": {
+                "name": f"Bench Event {i}",
+                "description": f"<p>Event <strong>{i}</strong> &amp; friends.</p><ul><li>Bring a Bible</li></ul>",
+                "summary": f"Summary {i}",
+                "image_url": f"https://images.example.com/{event_id}.jpg",
+                "visible_in_church_center": i % 10 != 0,
+                "updated_at": stamp,
+            },
+        }
+        instances = []
+        for n in range(2 if i % 5 == 0 else 1):
+            starts_at = now + timedelta(hours=i + 1, days=7 * n)
+            instances.append({
+                "type": "EventInstance",
+                "id": f"{event_id}-{n}",
+                "attributes": {
+                    "starts_at": starts_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "ends_at": (starts_at + timedelta(hours=2)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "location": "Main Campus",
+                    "church_center_url": f"https://example.churchcenter.com/calendar/event/{event_id}",
+                    "updated_at": stamp,
+                },
+                "relationships": {"event": {"data": {"type": "Event", "id": event_id}}},
+            })
+        calendar.append({"event": event, "instances": instances})
+    return calendar
+
+
+class FakeState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset([], 0)
+
+    def reset(self, calendar, existing_items):
+        with self.lock:
+            self.events = [c["event"] for c in calendar]
+            self.instances = sorted(
+                (inst for c in calendar for inst in c["instances"]),
+                key=lambda inst: inst["attributes"]["starts_at"],
+            )
+            self.instances_by_event = {c["event"]["id"]: c["instances"] for c in calendar}
+            self.events_by_id = {c["event"]["id"]: c["event"] for c in calendar}
+            self.items = {}
+            for n in range(existing_items):
+                # Stale items no PCO event maps to, as a real collection accumulates;
+                # every third was left as a never-published draft.
+                item = self._add_item({"name": f"Old Event {n}", "slug": f"old-event-{n}"})
+                if n % 3 == 0:
+                    item.update(isDraft=True, lastPublished=None)
+            self.requests = {"pco": 0, "webflow": 0}
+
+    def _add_item(self, field_data):
+        item_id = uuid.uuid4().hex[:24]
+        self.items[item_id] = {
+            "id": item_id,
+            "fieldData": field_data,
+            "isDraft": False,
+            "isArchived": False,
+            "lastPublished": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        return self.items[item_id]
+
+
+# ---------------- FAKE SERVERS ----------------
+def page(resources, query, base_url, per_page_default=25):
+    per_page = int(query.get("per_page", [per_page_default])[0])
+    offset = int(query.get("offset", [0])[0])
+    chunk = resources[offset : offset + per_page]
+    links = {}
+    if offset + per_page < len(resources):
+        next_query = {k: v[0] for k, v in query.items()}
+        next_query["offset"] = offset + per_page
+        links["next"] = f"{base_url}?{urlencode(next_query)}"
+    return chunk, links
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/__stats":
+                with state.lock:
+                    return self.send_json(200, state.requests)
+            if url.path.startswith("/calendar/"):
+                return self.pco(url, query)
+            return self.webflow("GET", url, query)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path == "/__reset":
+                body = self.read_json()
+                state.reset(body["calendar"], body["existing_items"])
+                return self.send_json(200, {})
+            return self.webflow("POST", url, parse_qs(url.query))
+
+        def do_PATCH(self):
+            url = urlparse(self.path)
+            return self.webflow("PATCH", url, parse_qs(url.query))
+
+        def do_DELETE(self):
+            url = urlparse(self.path)
+            return self.webflow("DELETE", url, parse_qs(url.query))
+
+        def pco(self, url, query):
+            with state.lock:
+                state.requests["pco"] += 1
+            base_url = f"http://{self.headers['Host']}{url.path}"
+            since = query.get("where[updated_at][gte]", [""])[0]
+            parts = url.path.strip("/").split("/")
+
+            if parts[-1] == "events":
+                events = [e for e in state.events if e["attributes"]["updated_at"] >= since]
+                data, links = page(events, query, base_url)
+                return self.send_json(200, {"data": data, "included": [], "links": links})
+
+            if parts[-1] == "event_instances" and len(parts) == 5:
+                instances = state.instances_by_event.get(parts[3], [])
+                return self.send_json(200, {"data": instances, "included": [], "links": {}})
+
+            if parts[-1] == "event_instances":
+                instances = [i for i in state.instances if i["attributes"]["updated_at"] >= since]
+                data, links = page(instances, query, base_url)
+                event_ids = {i["relationships"]["event"]["data"]["id"] for i in data}
+                included = [state.events_by_id[e] for e in sorted(event_ids)]
+                return self.send_json(200, {"data": data, "included": included, "links": links})
+
+            return self.send_json(404, {"errors": [{"detail": "not found"}]})
+
+        def webflow(self, method, url, query):
+            with state.lock:
+                state.requests["webflow"] += 1
+                if not url.path.startswith(f"/v2/collections/{COLLECTION_ID}/items"):
+                    return self.send_json(404, {"message": "not found"})
+                live = url.path.endswith("/live")
+
+                if method == "GET":
+                    items = list(state.items.values())
+                    limit = int(query.get("limit", [100])[0])
+                    offset = int(query.get("offset", [0])[0])
+                    return self.send_json(200, {
+                        "items": items[offset : offset + limit],
+                        "pagination": {"limit": limit, "offset": offset, "total": len(items)},
+                    })
+
+                body = self.read_json()
+                payload_items = body.get("items", [])
+
+                if method == "POST" and live:
+                    slugs = {it["fieldData"]["slug"] for it in state.items.values()}
+                    details = [
+                        {"param": f"items[{n}].fieldData.slug", "description": "Unique value is already in database"}
+                        for n, it in enumerate(payload_items)
+                        if it["fieldData"]["slug"] in slugs
+                    ]
+                    if details:
+                        return self.send_json(400, {"message": "Validation Error", "details": details})
+                    created = [state._add_item(dict(it["fieldData"])) for it in payload_items]
+                    return self.send_json(202, {"items": created})
+
+                if method == "PATCH":
+                    updated = []
+                    for it in payload_items:
+                        item = state.items.get(it["id"])
+                        if item is None:
+                            continue
+                        item["fieldData"].update(it.get("fieldData") or {})
+                        if "isArchived" in it:
+                            item["isArchived"] = it["isArchived"]
+                        updated.append(item)
+                    return self.send_json(200, {"items": updated})
+
+                if method == "DELETE":
+                    if live:
+                        # Webflow rejects unpublishing an item that is not live.
+                        unpublished = [it["id"] for it in payload_items
+                                       if it["id"] in state.items and not state.items[it["id"]].get("lastPublished")]
+                        if unpublished:
+                            return self.send_json(404, {"message": f"Items not published: {unpublished}"})
+                        for it in payload_items:
+                            if it["id"] in state.items:
+                                state.items[it["id"]]["lastPublished"] = None
+                    else:
+                        for it in payload_items:
+                            state.items.pop(it["id"], None)
+                    return self.send_json(200, {})
+
+                return self.send_json(405, {"message": "method not allowed"})
+
+    return Handler
+
+
+def serve(port_queue):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(FakeState()))
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+# ---------------- BENCHMARK ----------------
+def import_event_automation(base_url, state_file, args):
+    os.environ.update({
+        "PCO_APP_ID": "bench",
+        "PCO_SECRET": "bench",
+        "WEBFLOW_TOKEN": "bench",
+        "COLLECTION_ID": COLLECTION_ID,
+        "PCO_API_BASE": base_url,
+        "WEBFLOW_API_BASE": f"{base_url}/v2",
+        "EVENT_SYNC_STATE_FILE": state_file,
+        "SYNC_MODE": "full",
+        "PCO_FETCH_MODE": args.fetch_mode,
+        "SYNC_CONCURRENCY": str(args.concurrency),
+        "PRUNE_MODE": args.prune_mode,
+    })
+    import Event_automation
+    return Event_automation
+
+
+def timed_run(module, base_url):
+    before = requests.get(f"{base_url}/__stats").json()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        module.run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after = requests.get(f"{base_url}/__stats").json()
+    return {
+        "pco": after["pco"] - before["pco"],
+        "webflow": after["webflow"] - before["webflow"],
+        "seconds": elapsed,
+        "peak_mb": peak / 1e6,
+    }
+
+
+def record(path):
+    import Event_automation
+    calendar = [
+        {"event": event, "instances": [{"type": "EventInstance", "id": event["id"], "attributes": instance,
+                                        "relationships": {"event": {"data": {"type": "Event", "id": event["id"]}}}}]}
+        for event, instance in Event_automation.iter_events_with_first_instance()
+    ]
+    with open(path, "w") as f:
+        json.dump(calendar, f, indent=2)
+    print(f"Recorded {len(calendar)} events to {path}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="100,1000,10000", help="comma-separated event counts")
+    ap.add_argument("--existing", type=float, default=0.1,
+                    help="stale items pre-seeded in Webflow, as a fraction of the event count")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--fetch-mode", default="compound", choices=["compound", "per_event"])
+    ap.add_argument("--prune-mode", default="report", choices=["off", "report", "archive", "delete"])
+    ap.add_argument("--record", help="save the live PCO calendar to this JSON file and exit")
+    ap.add_argument("--replay", help="serve a calendar recorded with --record instead of synthetic events")
+    args = ap.parse_args()
+
+    if args.record:
+        record(args.record)
+        return
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(port_queue,), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get(timeout=10)}"
+
+    state_dir = tempfile.mkdtemp(prefix="event-sync-bench-")
+    state_file = os.path.join(state_dir, "state.json")
+    module = import_event_automation(base_url, state_file, args)
+
+    if args.replay:
+        with open(args.replay) as f:
+            scenarios = [(f"replay:{os.path.basename(args.replay)}", json.load(f))]
+    else:
+        scenarios = [(str(n), synthetic_calendar(n)) for n in (int(s) for s in args.sizes.split(","))]
+
+    header = f"{'events':>16} {'run':>5} {'PCO req':>8} {'WF req':>7} {'wall s':>8} {'peak MB':>8}"
+    print(header)
+    print("-" * len(header))
+    try:
+        for label, calendar in scenarios:
+            existing = int(len(calendar) * args.existing)
+            requests.post(f"{base_url}/__reset", json={"calendar": calendar, "existing_items": existing})
+            if os.path.exists(state_file):
+                os.remove(state_file)
+            module._clean_html.cache_clear()
+
+            for run_label in ("cold", "warm"):
+                r = timed_run(module, base_url)
+                print(f"{label:>16} {run_label:>5} {r['pco']:>8} {r['webflow']:>7} "
+                      f"{r['seconds']:>8.2f} {r['peak_mb']:>8.1f}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
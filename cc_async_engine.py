@@ -0,0 +1,268 @@
+"""
+asyncio ingestion engine for the connection card sync.
+
+Selected with `python CCsubmission_import.py --engine async` (or CC_ENGINE=async).
+Per form, a producer task pages through PCO submissions on a pooled
+httpx.AsyncClient and fetches any values the include did not cover, while a
+consumer task resolves people and upserts rows with the async Supabase
+client. A bounded queue between them (CC_PIPELINE_DEPTH pages) gives
+back-pressure, so page fetch, value fetch and database writes overlap
+instead of alternating. Mapping, row building and checkpoints come from
+CCsubmission_import.
+"""
+import asyncio
+import itertools
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from supabase import AsyncClient, acreate_client
+
+import CCsubmission_import as cc
+from pco_rate_limit import pco_limiter
+
+PIPELINE_DEPTH = int(os.getenv("CC_PIPELINE_DEPTH", "2"))
+
+Result = Tuple[str, str, bool]
+
+
+async def pco_get(http: httpx.AsyncClient, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    response = await pco_limiter.request_async(lambda: http.get(url, params=params))
+    response.raise_for_status()
+    return response.json()
+
+
+class AsyncPeopleResolver(cc.PeopleResolver):
+    """
+    PeopleResolver on the async Supabase client; the in-memory and SQLite
+    cache handling is inherited unchanged.
+    """
+
+    def __init__(self, db: AsyncClient, cache_path: Optional[str] = cc.PEOPLE_CACHE_PATH) -> None:
+        super().__init__(cache_path)
+        self.client = db
+        self.alock = asyncio.Lock()
+
+    async def aresolve(
+        self,
+        person_ids: List[Optional[str]],
+        people_lookup: Dict[str, Dict[str, Any]],
+    ) -> Dict[str, Optional[str]]:
+        wanted = {pid for pid in person_ids if pid}
+        async with self.alock:
+            unknown = [pid for pid in wanted if pid not in self.cache]
+            if unknown:
+                await self._aload(unknown, people_lookup)
+            return {pid: self.cache.get(pid) for pid in wanted}
+
+    async def _alookup(self, person_ids: List[str]) -> Dict[str, str]:
+        existing = await cc.people_select(self.client, person_ids).execute()
+        return {row["planning_center_id"]: row["id"] for row in existing.data or []}
+
+    async def _aload(self, person_ids: List[str], people_lookup: Dict[str, Dict[str, Any]]) -> None:
+        new_people = self._new_people(person_ids, await self._alookup(person_ids), people_lookup)
+        if not new_people:
+            return
+
+        inserted = await cc.people_insert(self.client, new_people).execute()
+        leftover = self._remember_inserted(inserted.data or [], new_people)
+        if leftover:
+            self._remember(await self._alookup(leftover))
+
+
+async def upsert_submissions(db: AsyncClient, table: str, rows: List[Dict[str, Any]]) -> Dict[str, Exception]:
+    """
+    Async twin of cc.upsert_submissions: one list upsert, row-by-row on failure.
+    """
+    if not rows:
+        return {}
+
+    try:
+        await cc.submissions_upsert(db, table, rows).execute()
+        return {}
+    except Exception as e:
+        print(f"Batch upsert of {len(rows)} submissions failed ({e}); retrying row by row")
+
+    failed: Dict[str, Exception] = {}
+    for row in rows:
+        try:
+            await cc.submissions_upsert(db, table, row).execute()
+        except Exception as e:
+            failed[row["submission_id"]] = e
+    return failed
+
+
+async def retry_stale_people(
+    db: AsyncClient,
+    table: str,
+    batch: List[Dict[str, Any]],
+    failed: Dict[str, Exception],
+    people: AsyncPeopleResolver,
+    people_lookup: Dict[str, Dict[str, Any]],
+) -> Dict[str, Exception]:
+    stale_rows = cc.stale_person_rows(batch, failed)
+    if not stale_rows:
+        return failed
+
+    stale = people.invalidate([row["person_id"] for row in stale_rows])
+    fresh = await people.aresolve(list(stale.values()), people_lookup)
+    retried, remaining = cc.remap_stale_rows(stale_rows, stale, fresh, failed)
+    remaining.update(await upsert_submissions(db, table, retried))
+    return remaining
+
+
+# -----------------------------
+# PIPELINE
+# -----------------------------
+async def prepare_page(
+    http: httpx.AsyncClient,
+    form_id: str,
+    submissions: List[Dict[str, Any]],
+    included: List[Dict[str, Any]],
+    log,
+) -> Dict[str, Any]:
+    """
+    Producer side: answers for every submission, fetching the ones the
+    include did not cover concurrently.
+    """
+    fields = cc.FORMS[form_id]["fields"]
+    people_lookup, values_lookup = cc.index_included(included)
+
+    submissions = sorted(submissions, key=lambda s: s.get("attributes", {}).get("created_at") or "")
+    page_values = [(cc.included_answers(sub, values_lookup, fields), None) for sub in submissions]
+
+    async def fetch(submission_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[Exception]]:
+        url = f"{cc.PCO_FORMS_URL}/{form_id}/form_submissions/{submission_id}/form_submission_values"
+        try:
+            payload = await pco_get(http, url)
+            return cc.map_answers(payload.get("data", []), fields), None
+        except Exception as e:
+            return None, e
+
+    missing = [i for i, (answers, _) in enumerate(page_values) if answers is None]
+    if missing:
+        log(f"Fetching values for {len(missing)} submissions not covered by the include")
+        fetched = await asyncio.gather(*(fetch(submissions[i]["id"]) for i in missing))
+        for i, result in zip(missing, fetched):
+            page_values[i] = result
+
+    return {"submissions": submissions, "values": page_values, "people_lookup": people_lookup}
+
+
+async def write_page(
+    db: AsyncClient,
+    form_id: str,
+    page: Dict[str, Any],
+    people: AsyncPeopleResolver,
+    log,
+) -> List[Result]:
+    """
+    Consumer side: resolve people, then upsert the page's rows.
+    """
+    table = cc.FORMS[form_id]["table"]
+    submissions = page["submissions"]
+
+    try:
+        person_uuids = await people.aresolve(
+            [cc.submission_person_id(sub) for sub in submissions], page["people_lookup"]
+        )
+    except Exception as e:
+        log(f"Skipping {len(submissions)} submissions: could not resolve people: {e}")
+        return [(sub.get("attributes", {}).get("created_at"), sub["id"], False) for sub in submissions]
+
+    rows, results = cc.build_page_rows(submissions, page["values"], person_uuids, log)
+
+    for i in range(0, len(rows), cc.UPSERT_BATCH_SIZE):
+        batch = rows[i : i + cc.UPSERT_BATCH_SIZE]
+        failed = await upsert_submissions(db, table, batch)
+        if failed:
+            failed = await retry_stale_people(db, table, batch, failed, people, page["people_lookup"])
+        for submission_id, e in failed.items():
+            log(f"Skipping submission {submission_id}: {e}")
+        results.extend(
+            (row["created_at"], row["submission_id"], row["submission_id"] not in failed)
+            for row in batch
+        )
+
+    return results
+
+
+async def sync_form(
+    http: httpx.AsyncClient,
+    db: AsyncClient,
+    form_id: str,
+    people: AsyncPeopleResolver,
+) -> Dict[str, int]:
+    form = cc.FORMS[form_id]
+    sync_state_key = f"connection_cards:{form_id}"
+
+    def log(message: str) -> None:
+        print(f"[{form['name']}] {message}")
+
+    # The checkpoint is one small read and write per run; the sync client is fine for it.
+    cutoff, checkpoint_id, failed_attempts = await asyncio.to_thread(cc.form_cutoff, sync_state_key, log)
+    log(f"Starting async connection card sync from {cutoff.isoformat()} UTC...")
+
+    base_url = f"{cc.PCO_FORMS_URL}/{form_id}/form_submissions"
+    pages: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+    stats = {"seen": 0, "skipped_old": 0}
+    results: List[Result] = []
+
+    async def produce() -> None:
+        for page_num in itertools.count(1):
+            payload = await pco_get(http, base_url, cc.submissions_page_params(page_num))
+            submissions = payload.get("data", [])
+            if not submissions:
+                log("No submissions returned; stopping.")
+                break
+
+            cc.log_page(log, page_num, submissions)
+            recent = cc.split_recent(submissions, cutoff, checkpoint_id)
+            stats["seen"] += len(submissions)
+            stats["skipped_old"] += len(submissions) - len(recent)
+            if not recent:
+                log(f"Stopping early: page {page_num} is entirely older than the cutoff.")
+                break
+
+            # Blocks while the consumer is PIPELINE_DEPTH pages behind.
+            await pages.put(await prepare_page(http, form_id, recent, payload.get("included", []), log))
+        await pages.put(None)
+
+    async def consume() -> None:
+        while (page := await pages.get()) is not None:
+            results.extend(await write_page(db, form_id, page, people, log))
+
+    async with asyncio.TaskGroup() as group:
+        group.create_task(produce())
+        group.create_task(consume())
+
+    newest, still_failing = cc.advance_checkpoint(results, failed_attempts, log)
+    if newest or still_failing != failed_attempts:
+        await asyncio.to_thread(cc.save_checkpoint, sync_state_key, newest, still_failing)
+    if newest:
+        log(f"Checkpoint advanced to submission {newest[1]} created {newest[0]}")
+
+    return {**stats, "upserted": sum(1 for _, _, ok in results if ok)}
+
+
+async def run() -> None:
+    db = await acreate_client(cc.SUPABASE_URL, cc.SUPABASE_SERVICE_ROLE_KEY)
+    people = AsyncPeopleResolver(db)
+    limits = httpx.Limits(max_connections=cc.FETCH_WORKERS, max_keepalive_connections=cc.FETCH_WORKERS)
+
+    async with httpx.AsyncClient(
+        auth=(cc.PCO_APP_ID, cc.PCO_SECRET),
+        limits=limits,
+        timeout=cc.REQUEST_TIMEOUT,
+    ) as http:
+        stats = await asyncio.gather(*(sync_form(http, db, form_id, people) for form_id in cc.FORMS))
+
+    cc.print_summary(dict(zip(cc.FORMS, stats)))
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Near-real-time connection card ingest from PCO webhooks.
+
+Runs a small HTTP service that accepts PCO webhook deliveries for form
+submissions, checks their X-PCO-Webhooks-Authenticity signature and queues
+the submission ids. A worker thread drains the queue, re-reads each
+submission from PCO with its person and values included, and hands them to
+the same mapping / upsert path as the cron sync (CCsubmission_import).
+
+    python cc_webhook_receiver.py                           # serve on CC_WEBHOOK_PORT
+    python cc_webhook_receiver.py --replay delivery.json    # post a saved delivery to a local instance
+    python cc_webhook_receiver.py --replay delivery.json --dry-run   # same, only logging what would be ingested
+    python cc_webhook_receiver.py --replay-submission submission.json
+        # map and "upsert" a saved PCO form submission against an in-memory
+        # Supabase; needs no credentials
+
+The cron sync still runs; its upserts are idempotent, so a card that arrives
+both ways is written twice with the same values.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import queue
+import sys
+import threading
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+# CCsubmission_import builds its PCO and Supabase clients at import time;
+# --replay-submission never uses them, so placeholders are enough there.
+if "--replay-submission" in sys.argv:
+    for name, placeholder in (
+        ("PCO_APP_ID", "replay"),
+        ("PCO_SECRET", "replay"),
+        ("SUPABASE_URL", "http://127.0.0.1"),
+        ("SUPABASE_SERVICE_ROLE_KEY", "replay"),
+    ):
+        os.environ.setdefault(name, placeholder)
+
+import CCsubmission_import as cc  # noqa: E402
+
+# One secret per webhook subscription; PCO signs each with its own.
+WEBHOOK_SECRETS = [s for s in os.getenv("PCO_WEBHOOK_SECRET", "").split(",") if s]
+WEBHOOK_PORT = int(os.getenv("CC_WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = "/webhooks/pco"
+ACCEPTED_EVENTS = {"people.v2.events.form_submission.created"}
+# Submissions handed to ingest at once when several deliveries queue up.
+DRAIN_BATCH = 50
+
+
+# -----------------------------
+# DELIVERIES
+# -----------------------------
+def sign(body: bytes, secret: str) -> str:
+    return hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body: bytes, signature: Optional[str], secrets: List[str]) -> bool:
+    if not signature:
+        return False
+    return any(hmac.compare_digest(sign(body, secret), signature) for secret in secrets)
+
+
+def parse_deliveries(body: bytes) -> List[Tuple[str, str]]:
+    """
+    Returns (form_id, submission_id) for every form submission event in a
+    PCO webhook body. Each delivery carries its resource as a JSON string.
+    """
+    found = []
+    for delivery in json.loads(body).get("data", []):
+        attributes = delivery.get("attributes", {})
+        if attributes.get("name") not in ACCEPTED_EVENTS:
+            continue
+        payload = attributes.get("payload") or "{}"
+        resource = (json.loads(payload) if isinstance(payload, str) else payload).get("data") or {}
+        form_ref = resource.get("relationships", {}).get("form", {}).get("data") or {}
+        if resource.get("id") and form_ref.get("id"):
+            found.append((form_ref["id"], resource["id"]))
+    return found
+
+
+# -----------------------------
+# WORKER
+# -----------------------------
+def fetch_submission(form_id: str, submission_id: str) -> Dict[str, Any]:
+    url = f"{cc.PCO_FORMS_URL}/{form_id}/form_submissions/{submission_id}"
+    return cc.pco_get(url, {"include": "person,form_submission_values"})
+
+
+def ingest_form(
+    form_id: str,
+    submissions: List[Dict[str, Any]],
+    included: List[Dict[str, Any]],
+    people: "cc.PeopleResolver",
+) -> None:
+    results = cc.ingest_submissions(form_id, submissions, included, people, log=lambda m: print(f"[webhook] {m}"))
+    ok = sum(1 for _, _, success in results if success)
+    print(f"[webhook] Form {form_id}: upserted {ok}/{len(results)} submissions")
+
+
+def ingest_batch(batch: List[Tuple[str, str]], people: "cc.PeopleResolver") -> None:
+    by_form: Dict[str, List[str]] = defaultdict(list)
+    for form_id, submission_id in batch:
+        if submission_id not in by_form[form_id]:
+            by_form[form_id].append(submission_id)
+
+    for form_id, submission_ids in by_form.items():
+        submissions: List[Dict[str, Any]] = []
+        included: List[Dict[str, Any]] = []
+        for submission_id in submission_ids:
+            try:
+                payload = fetch_submission(form_id, submission_id)
+            except Exception as e:
+                print(f"[webhook] Could not fetch submission {submission_id}: {e}")
+                continue
+            submissions.append(payload["data"])
+            included.extend(payload.get("included", []))
+
+        if submissions:
+            ingest_form(form_id, submissions, included, people)
+
+
+def run_worker(work: "queue.Queue[Tuple[str, str]]", dry_run: bool) -> None:
+    people = None if dry_run else cc.PeopleResolver()
+    while True:
+        batch = [work.get()]
+        while len(batch) < DRAIN_BATCH:
+            try:
+                batch.append(work.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if dry_run:
+                for form_id, submission_id in batch:
+                    print(f"[webhook] dry run: would ingest submission {submission_id} of form {form_id}")
+            else:
+                ingest_batch(batch, people)
+        except Exception as e:
+            print(f"[webhook] Ingest failed for {len(batch)} submissions: {e}")
+        finally:
+            for _ in batch:
+                work.task_done()
+
+
+# -----------------------------
+# SERVER
+# -----------------------------
+def make_handler(work: "queue.Queue[Tuple[str, str]]", secrets: List[str]):
+    class Handler(BaseHTTPRequestHandler):
+        def send_text(self, status: int, text: str) -> None:
+            data = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path == "/healthz":
+                return self.send_text(200, f"ok, {work.qsize()} queued")
+            self.send_text(404, "not found")
+
+        def do_POST(self) -> None:
+            if self.path != WEBHOOK_PATH:
+                return self.send_text(404, "not found")
+
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not verify_signature(body, self.headers.get("X-PCO-Webhooks-Authenticity"), secrets):
+                return self.send_text(401, "bad signature")
+
+            try:
+                deliveries = parse_deliveries(body)
+            except (ValueError, AttributeError) as e:
+                return self.send_text(400, f"unreadable delivery: {e}")
+
+            queued = 0
+            for form_id, submission_id in deliveries:
+                if form_id in cc.FORMS:
+                    work.put((form_id, submission_id))
+                    queued += 1
+            # Acknowledge quickly; PCO retries deliveries that time out.
+            self.send_text(200, f"queued {queued}")
+
+    return Handler
+
+
+def serve(port: int, dry_run: bool) -> ThreadingHTTPServer:
+    if not WEBHOOK_SECRETS:
+        raise SystemExit("Missing PCO_WEBHOOK_SECRET env var.")
+
+    work: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+    threading.Thread(target=run_worker, args=(work, dry_run), daemon=True).start()
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), make_handler(work, WEBHOOK_SECRETS))
+    server.work = work
+    print(f"Listening for PCO webhooks on :{server.server_address[1]}{WEBHOOK_PATH}")
+    return server
+
+
+def replay(path: str, dry_run: bool) -> None:
+    """
+    Serves on a free local port, posts a saved delivery signed with the
+    configured secret, and waits until the worker has drained it.
+    """
+    server = serve(0, dry_run)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with open(path, "rb") as f:
+        body = f.read()
+    resp = requests.post(
+        f"http://127.0.0.1:{server.server_address[1]}{WEBHOOK_PATH}",
+        data=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-PCO-Webhooks-Authenticity": sign(body, WEBHOOK_SECRETS[0]),
+        },
+        timeout=cc.REQUEST_TIMEOUT,
+    )
+    print(f"Replay response: {resp.status_code} {resp.text}")
+    server.work.join()
+    server.shutdown()
+
+
+# -----------------------------
+# OFFLINE REPLAY
+# -----------------------------
+class StubQuery:
+    """
+    The part of the PostgREST query builder the ingest path uses, over
+    in-memory tables. Upserts are printed so a replay shows what would be written.
+    """
+
+    def __init__(self, tables: Dict[str, List[Dict[str, Any]]], name: str) -> None:
+        self.rows = tables[name]
+        self.name = name
+        self.filters: List[Tuple[str, set]] = []
+        self.pending: Optional[List[Dict[str, Any]]] = None
+
+    def select(self, columns: str) -> "StubQuery":
+        return self
+
+    def in_(self, column: str, values: List[Any]) -> "StubQuery":
+        self.filters.append((column, set(values)))
+        return self
+
+    def eq(self, column: str, value: Any) -> "StubQuery":
+        return self.in_(column, [value])
+
+    def limit(self, count: int) -> "StubQuery":
+        return self
+
+    def upsert(self, rows: Any, on_conflict: str = "id", ignore_duplicates: bool = False) -> "StubQuery":
+        self.pending = rows if isinstance(rows, list) else [rows]
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def execute(self) -> Any:
+        if self.pending is None:
+            data = [row for row in self.rows if all(row.get(c) in values for c, values in self.filters)]
+            return type("Response", (), {"data": data})()
+
+        written = []
+        for new in self.pending:
+            row = next((r for r in self.rows if r.get(self.on_conflict) == new.get(self.on_conflict)), None)
+            if row is None:
+                row = {"id": str(uuid.uuid4()), **new}
+                self.rows.append(row)
+            elif self.ignore_duplicates:
+                continue
+            else:
+                row.update(new)
+            written.append(row)
+            print(f"[replay] upsert {self.name}: {json.dumps(new, default=str)}")
+        return type("Response", (), {"data": written})()
+
+
+class StubSupabase:
+    def __init__(self) -> None:
+        self.tables: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+
+    def table(self, name: str) -> StubQuery:
+        return StubQuery(self.tables, name)
+
+
+def replay_submission(path: str) -> None:
+    """
+    Runs a saved PCO form submission (the body of GET
+    .../form_submissions/<id>?include=person,form_submission_values, with
+    data as one resource or a list) through the worker's ingest path, with
+    Supabase replaced by StubSupabase and no people cache.
+    """
+    with open(path) as f:
+        payload = json.load(f)
+    resources = payload["data"] if isinstance(payload["data"], list) else [payload["data"]]
+
+    by_form: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for resource in resources:
+        form_ref = resource.get("relationships", {}).get("form", {}).get("data") or {}
+        if form_ref.get("id") not in cc.FORMS:
+            print(f"[replay] Skipping submission {resource.get('id')}: form {form_ref.get('id')} is not in CC_FORMS")
+            continue
+        by_form[form_ref["id"]].append(resource)
+
+    cc.supabase = StubSupabase()
+    people = cc.PeopleResolver(cache_path=None)
+    for form_id, submissions in by_form.items():
+        ingest_form(form_id, submissions, payload.get("included", []), people)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=WEBHOOK_PORT)
+    ap.add_argument("--replay", help="post this saved webhook body to a local instance and exit")
+    ap.add_argument("--dry-run", action="store_true", help="log queued submissions instead of ingesting them")
+    ap.add_argument(
+        "--replay-submission",
+        metavar="FILE",
+        help="ingest a saved PCO form submission against an in-memory Supabase and exit",
+    )
+    args = ap.parse_args()
+
+    if args.replay_submission:
+        replay_submission(args.replay_submission)
+        return
+
+    if args.replay:
+        replay(args.replay, args.dry_run)
+        return
+
+    server = serve(args.port, args.dry_run)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
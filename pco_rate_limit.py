@@ -0,0 +1,118 @@
+"""
+Shared Planning Center API pacing for the sync scripts.
+
+PCO reports the request budget on every response:
+
+    X-PCO-API-Request-Rate-Limit   requests allowed per period
+    X-PCO-API-Request-Rate-Period  period length in seconds
+    X-PCO-API-Request-Rate-Count   requests already used in the current period
+
+and answers 429 with Retry-After once it is spent. PCORateLimiter is a token
+bucket sized from those headers: requests go out as fast as the budget
+allows and only wait when it is actually exhausted.
+"""
+import asyncio
+import threading
+import time
+
+# PCO's documented default until the first response says otherwise.
+DEFAULT_LIMIT = 100
+DEFAULT_PERIOD = 20.0
+MAX_RETRIES = 5
+
+
+class PCORateLimiter:
+    def __init__(self, limit=DEFAULT_LIMIT, period=DEFAULT_PERIOD):
+        self.limit = limit
+        self.period = period
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        rate = self.limit / self.period
+        self.tokens = min(float(self.limit), self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def _try_acquire(self):
+        """
+        Spends a token and returns None, or returns how long to wait first.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self.blocked_until - now
+            if wait > 0:
+                return wait
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return None
+            return (1 - self.tokens) * self.period / self.limit
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent, then spends one token.
+        """
+        while (wait := self._try_acquire()) is not None:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while (wait := self._try_acquire()) is not None:
+            await asyncio.sleep(wait)
+
+    def observe(self, response):
+        """
+        Re-syncs the bucket with the budget PCO reported on a response.
+        """
+        headers = response.headers
+        limit = headers.get("X-PCO-API-Request-Rate-Limit")
+        period = headers.get("X-PCO-API-Request-Rate-Period")
+        count = headers.get("X-PCO-API-Request-Rate-Count")
+
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if limit and period:
+                self.limit = int(limit)
+                self.period = float(period)
+            if count is not None:
+                # Other clients on the same app spend the same budget.
+                self.tokens = min(self.tokens, max(0.0, self.limit - int(count)))
+            if response.status_code == 429:
+                retry_after = headers.get("Retry-After")
+                delay = float(retry_after) if retry_after else self.period
+                self.blocked_until = max(self.blocked_until, now + delay)
+                self.tokens = 0.0
+
+    def request(self, send, max_retries=MAX_RETRIES):
+        """
+        Runs send() (one HTTP call returning a requests.Response) under the
+        limiter, retrying after Retry-After while PCO answers 429. The last
+        response is returned either way; callers still raise_for_status().
+        """
+        for attempt in range(max_retries + 1):
+            self.acquire()
+            response = send()
+            self.observe(response)
+            if response.status_code != 429 or attempt == max_retries:
+                return response
+            print(f"⏳ PCO rate limit hit; retrying after {response.headers.get('Retry-After') or self.period}s")
+        return response
+
+    async def request_async(self, send, max_retries=MAX_RETRIES):
+        """
+        request() for coroutines: send() returns an awaitable response.
+        """
+        for attempt in range(max_retries + 1):
+            await self.acquire_async()
+            response = await send()
+            self.observe(response)
+            if response.status_code != 429 or attempt == max_retries:
+                return response
+            print(f"⏳ PCO rate limit hit; retrying after {response.headers.get('Retry-After') or self.period}s")
+        return response
+
+
+# One bucket per process, shared by every PCO caller in it.
+pco_limiter = PCORateLimiter()
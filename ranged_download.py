@@ -0,0 +1,256 @@
+"""
+Parallel, resumable HTTP download for large sermon video files.
+
+The file is split into fixed-size byte ranges that are fetched concurrently
+into a preallocated file. Finished chunks are recorded in a sidecar
+`<out>.parts.json`, so a rerun after a dropped connection or a killed job
+only fetches what is missing. Servers that ignore Range get a plain
+single-stream download instead.
+
+    python ranged_download.py URL OUT                  # download URL to OUT
+    python ranged_download.py --serve DIR              # range-capable local server for DIR
+    python ranged_download.py --serve DIR --flaky 0.3  # ... that drops 30% of responses mid-body
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CHUNK_SIZE = int(float(os.getenv("DOWNLOAD_CHUNK_MB", "16")) * 1024 * 1024)
+WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+MAX_RETRIES = 5
+REQUEST_TIMEOUT = 60
+READ_SIZE = 1024 * 1024
+
+
+def make_session(workers):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def probe(session, url):
+    """
+    Returns (final url, size, validator, supports ranges). A one-byte ranged
+    GET is used instead of HEAD: signed CDN links often refuse HEAD, and it
+    answers the Range question directly.
+    """
+    with session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=REQUEST_TIMEOUT) as resp:
+        resp.raise_for_status()
+        validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified")
+        content_range = resp.headers.get("Content-Range", "")
+        if resp.status_code == 206 and "/" in content_range and not content_range.endswith("/*"):
+            return resp.url, int(content_range.rsplit("/", 1)[1]), validator, True
+        length = resp.headers.get("Content-Length")
+        return resp.url, int(length) if length else None, validator, False
+
+
+# ---------------- PROGRESS ----------------
+def sidecar_path(out_path):
+    return f"{out_path}.parts.json"
+
+
+def load_progress(out_path, size, chunk_size, validator):
+    """
+    Chunks already on disk from an earlier run of the same file, or an empty
+    set if the sidecar is missing or describes something else.
+    """
+    try:
+        with open(sidecar_path(out_path)) as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if (
+        progress.get("size") != size
+        or progress.get("chunk_size") != chunk_size
+        or progress.get("validator") != validator
+        or not os.path.exists(out_path)
+        or os.path.getsize(out_path) != size
+    ):
+        return set()
+    return set(progress.get("done", []))
+
+
+def save_progress(out_path, size, chunk_size, validator, done):
+    tmp_path = f"{sidecar_path(out_path)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"size": size, "chunk_size": chunk_size, "validator": validator, "done": sorted(done)}, f)
+    os.replace(tmp_path, sidecar_path(out_path))
+
+
+# ---------------- DOWNLOAD ----------------
+def fetch_chunk(session, url, out_path, start, end):
+    """
+    Writes bytes start..end (inclusive) into out_path. A dropped response is
+    retried from the last byte written, not from the start of the chunk.
+    """
+    position = start
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            headers = {"Range": f"bytes={position}-{end}"}
+            with session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as resp:
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    raise Exception(f"Server ignored Range for bytes {position}-{end} (status {resp.status_code})")
+                with open(out_path, "r+b") as f:
+                    f.seek(position)
+                    for block in resp.iter_content(READ_SIZE):
+                        block = block[: end + 1 - position]
+                        f.write(block)
+                        position += len(block)
+            if position > end:
+                return
+            raise Exception(f"Response ended at byte {position} of chunk {start}-{end}")
+        except Exception as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = 2 ** attempt
+            print(f"⚠️ Chunk {start}-{end} failed ({e}); retrying from byte {position} in {delay}s")
+            time.sleep(delay)
+
+
+def download_single(session, url, out_path, size):
+    with session.get(url, stream=True, timeout=REQUEST_TIMEOUT) as resp:
+        resp.raise_for_status()
+        written = 0
+        with open(out_path, "wb") as f:
+            for block in resp.iter_content(READ_SIZE):
+                f.write(block)
+                written += len(block)
+    if size is not None and written != size:
+        raise Exception(f"❌ Download truncated: got {written} of {size} bytes")
+
+
+def download(url, out_path, workers=WORKERS, chunk_size=CHUNK_SIZE):
+    """
+    Downloads url to out_path and returns out_path. Safe to call again after
+    a failure: chunks finished by the earlier attempt are kept.
+    """
+    session = make_session(workers)
+    start_time = time.monotonic()
+    url, size, validator, ranged = probe(session, url)
+
+    if not ranged or not size:
+        print("⬇️ Server does not support ranged downloads; using a single stream")
+        download_single(session, url, out_path, size)
+        print(f"✅ Downloaded {os.path.getsize(out_path) / 1e6:.0f} MB in {time.monotonic() - start_time:.1f}s")
+        return out_path
+
+    done = load_progress(out_path, size, chunk_size, validator)
+    if not done:
+        # Preallocate so every worker can write its range in place.
+        with open(out_path, "wb") as f:
+            f.truncate(size)
+
+    chunks = [(i, start, min(start + chunk_size, size) - 1) for i, start in enumerate(range(0, size, chunk_size))]
+    pending = [chunk for chunk in chunks if chunk[0] not in done]
+    if done:
+        print(f"↩️ Resuming download: {len(done)}/{len(chunks)} chunks already on disk")
+    print(f"⬇️ Downloading {size / 1e6:.0f} MB as {len(pending)} chunks on {workers} connections")
+
+    lock = threading.Lock()
+
+    def run(chunk):
+        index, start, end = chunk
+        fetch_chunk(session, url, out_path, start, end)
+        with lock:
+            done.add(index)
+            save_progress(out_path, size, chunk_size, validator, done)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # list() re-raises the first chunk that ran out of retries.
+        list(pool.map(run, pending))
+
+    actual = os.path.getsize(out_path)
+    if len(done) != len(chunks) or actual != size:
+        raise Exception(f"❌ Download incomplete: {len(done)}/{len(chunks)} chunks, {actual} of {size} bytes")
+
+    os.remove(sidecar_path(out_path))
+    elapsed = time.monotonic() - start_time
+    print(f"✅ Downloaded {size / 1e6:.0f} MB in {elapsed:.1f}s ({size / 1e6 / max(elapsed, 1e-6):.1f} MB/s)")
+    return out_path
+
+
+# ---------------- LOCAL TEST SERVER ----------------
+def make_range_handler(directory, flaky):
+    class RangeHandler(SimpleHTTPRequestHandler):
+        """
+        SimpleHTTPRequestHandler plus single-range `Range: bytes=a-b` support,
+        optionally cutting responses short to exercise retries and resume.
+        """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+        def do_GET(self):
+            range_header = self.headers.get("Range")
+            path = self.translate_path(self.path)
+            if not range_header or not range_header.startswith("bytes=") or not os.path.isfile(path):
+                return super().do_GET()
+
+            size = os.path.getsize(path)
+            first, _, last = range_header[len("bytes="):].partition("-")
+            start = int(first)
+            end = min(int(last) if last else size - 1, size - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+
+            length = end - start + 1
+            self.send_response(206)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Length", str(length))
+            self.end_headers()
+
+            send = length
+            if length > 1 and random.random() < flaky:
+                send = random.randint(0, length - 1)
+            with open(path, "rb") as f:
+                f.seek(start)
+                self.wfile.write(f.read(send))
+            if send < length:
+                self.close_connection = True
+
+    return RangeHandler
+
+
+def serve(directory, port=0, flaky=0.0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_range_handler(directory, flaky))
+    print(f"Serving {directory} with Range support on http://127.0.0.1:{server.server_address[1]}/")
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("url", nargs="?")
+    ap.add_argument("out", nargs="?")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--chunk-mb", type=float, default=CHUNK_SIZE / (1024 * 1024))
+    ap.add_argument("--serve", metavar="DIR", help="serve DIR with Range support instead of downloading")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--flaky", type=float, default=0.0, help="fraction of ranged responses to cut short")
+    args = ap.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.flaky).serve_forever()
+        return
+    if not args.url or not args.out:
+        ap.error("URL and OUT are required unless --serve is given")
+    download(args.url, args.out, args.workers, int(args.chunk_mb * 1024 * 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,13 @@ import json
 import re
 import requests
 import subprocess
+import time
 from datetime import datetime
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 
+import ranged_download
+
 # ---------------- ENV VARS ----------------
 WEBFLOW_TOKEN = os.getenv("WEBFLOW_TOKEN")
 COLLECTION_ID = "6671ed65cb61325256e73270"
@@ -19,6 +22,30 @@ VIMEO_ACCESS_TOKEN = os.getenv("VIMEO_ACCESS_TOKEN")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
+# ---------------- AUDIO SETTINGS ----------------
+# stream: ffmpeg reads the Vimeo URL itself, so download and encode overlap.
+# download: fetch the whole video to disk first, then encode.
+AUDIO_EXTRACT_MODE = os.getenv("AUDIO_EXTRACT_MODE", "stream")
+# smallest: lowest-bitrate progressive rendition that still has an audio track.
+# first: whatever Vimeo lists first in `download` (often the source file).
+VIMEO_RENDITION = os.getenv("VIMEO_RENDITION", "smallest")
+# Seconds the audio may fall short of the Vimeo duration before it counts as truncated.
+AUDIO_DURATION_TOLERANCE = float(os.getenv("AUDIO_DURATION_TOLERANCE", "2"))
+# Comma-separated encode profiles (see AUDIO_PROFILES); all are written by one
+# ffmpeg run and the first one is published to Spreaker. The rest stay at
+# <AUDIO_BASE_PATH>-<profile>.<ext>; run_upload.yml keeps the archive copy as
+# a workflow artifact.
+AUDIO_PROFILE = os.getenv("AUDIO_PROFILE", "archive-192k")
+# auto: the archive profile copies the source audio when Spreaker accepts its codec.
+# never: always transcode.
+AUDIO_REMUX = os.getenv("AUDIO_REMUX", "auto")
+# Whole-download attempts in download mode; later ones resume from the chunks
+# already on disk, since /tmp does not outlive the runner.
+DOWNLOAD_ATTEMPTS = int(os.getenv("DOWNLOAD_ATTEMPTS", "3"))
+VIDEO_PATH = "/tmp/temp_video.mp4"
+# Outputs are <base>-<profile>.<ext>; the extension follows the container.
+AUDIO_BASE_PATH = "/tmp/sermon_audio"
+
 # ---------------- GOOGLE SHEET ----------------
 def get_sheet_details():
     creds = service_account.Credentials.from_service_account_info(
@@ -72,30 +99,262 @@ def write_webflow_item_id_to_sheet(item_id: str):
     print(f"📝 Wrote webflow_item_id to sheet: {item_id}")
 
 # ---------------- VIMEO ----------------
+def describe_rendition(rendition):
+    label = rendition.get("public_name") or rendition.get("rendition") or rendition.get("quality") or "unknown"
+    size = rendition.get("size")
+    return f"{label} ({size / 1e6:.0f} MB)" if size else label
+
+def rendition_candidates(video):
+    """
+    Single-file renditions from the `download` and `files` lists, non-source
+    first and then smallest first. HLS / DASH entries are manifests, not files.
+    """
+    seen = set()
+    candidates = []
+    for rendition in (video.get("download") or []) + (video.get("files") or []):
+        link = rendition.get("link")
+        if not link or link in seen or rendition.get("quality") in ("hls", "dash"):
+            continue
+        seen.add(link)
+        candidates.append(rendition)
+    return sorted(candidates, key=lambda r: (r.get("quality") == "source", r.get("size") or float("inf")))
+
+def choose_rendition(video):
+    first = (video.get("download") or [{}])[0]
+    candidates = rendition_candidates(video)
+    if VIMEO_RENDITION == "first" or not candidates:
+        return first
+
+    chosen = None
+    for rendition in candidates:
+        # Reads only the container header; some low renditions ship without audio.
+        if probe_audio_stream(rendition["link"]):
+            chosen = rendition
+            break
+        print(f"⚠️ Skipping {describe_rendition(rendition)} rendition: no audio stream")
+    if not chosen:
+        print("⚠️ No rendition with a readable audio stream; using Vimeo's first download")
+        return first
+
+    # Savings are against what VIMEO_RENDITION=first would have fetched.
+    saved = (first.get("size") or 0) - (chosen.get("size") or 0)
+    if chosen.get("size") and saved > 0:
+        print(f"🎞️ Using {describe_rendition(chosen)} rendition instead of {describe_rendition(first)}; saves {saved / 1e6:.0f} MB")
+    else:
+        print(f"🎞️ Using {describe_rendition(chosen)} rendition")
+    return chosen
+
 def get_latest_vimeo_video():
     headers = {"Authorization": f"Bearer {VIMEO_ACCESS_TOKEN}"}
     params = {"sort": "date", "direction": "desc", "per_page": 1}
     resp = requests.get("https://api.vimeo.com/me/videos", headers=headers, params=params)
     resp.raise_for_status()
     video = resp.json()["data"][0]
+    rendition = choose_rendition(video)
     return {
         "url": video["link"],
         "uri": video["uri"],
-        "download": video.get("download", [{}])[0].get("link")
+        "duration": video.get("duration"),
+        "download": rendition.get("link"),
     }
 
 # ---------------- AUDIO EXTRACTION ----------------
-def extract_audio(video_url):
-    print("Extracting audio...")
-    video_path = "/tmp/temp_video.mp4"
-    audio_path = "/tmp/sermon_audio.mp3"
-    subprocess.run(["curl", "-L", video_url, "-o", video_path], check=True)
-    subprocess.run([
-        "ffmpeg", "-i", video_path,
-        "-vn", "-acodec", "libmp3lame", "-ac", "2", "-ab", "192k", "-ar", "44100",
-        audio_path
-    ], check=True)
-    return audio_path
+# Reconnect instead of ending the input early when the HTTP body drops mid-stream.
+STREAM_INPUT_ARGS = [
+    "-reconnect", "1",
+    "-reconnect_streamed", "1",
+    "-reconnect_on_network_error", "1",
+    "-reconnect_delay_max", "30",
+]
+
+def probe_duration(path):
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+        check=True, capture_output=True, text=True,
+    ).stdout.strip()
+    try:
+        return float(out)
+    except ValueError:
+        return None
+
+def probe_audio_stream(source):
+    """
+    Returns {"codec_name", "bit_rate", "channels", "sample_rate"} for the first
+    audio stream (numbers as ints, None where ffprobe has no value), or None
+    if there is no audio stream or the source cannot be read.
+    """
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=codec_name,bit_rate,channels,sample_rate", "-of", "json", source],
+            check=True, capture_output=True, text=True, timeout=120,
+        ).stdout
+        streams = json.loads(out).get("streams") or []
+    except (subprocess.SubprocessError, ValueError):
+        return None
+    if not streams:
+        return None
+
+    stream = {"codec_name": streams[0].get("codec_name")}
+    for key in ("bit_rate", "channels", "sample_rate"):
+        value = streams[0].get(key)
+        stream[key] = int(value) if str(value).isdigit() else None
+    return stream
+
+def check_audio_duration(audio_path, expected_duration):
+    """
+    A stream that ends early still leaves ffmpeg with a valid, shorter file,
+    so compare it with the duration Vimeo reports.
+    """
+    if not expected_duration:
+        return
+    actual = probe_duration(audio_path)
+    if actual is None or actual < expected_duration - AUDIO_DURATION_TOLERANCE:
+        raise Exception(f"❌ Extracted audio is {actual}s but the video is {expected_duration}s; input was truncated")
+
+# MP3 targets; sample_rate is the output rate and the minimum a copied source needs.
+AUDIO_PROFILES = {
+    "speech-mono-64k": {"channels": 1, "bit_rate": 64000, "sample_rate": 44100},
+    "speech-stereo-96k": {"channels": 2, "bit_rate": 96000, "sample_rate": 44100},
+    "archive-192k": {"channels": 2, "bit_rate": 192000, "sample_rate": 44100},
+}
+# Profile that may be replaced by a straight copy of the source audio.
+REMUX_PROFILE = "archive-192k"
+# Source audio codecs Spreaker takes as-is, with the container to copy them into.
+REMUX_CONTAINERS = {"aac": ".m4a", "mp3": ".mp3"}
+# Encoders report a little under their nominal rate (191.9k for "192k").
+REMUX_BIT_RATE_SLACK = 0.95
+
+def profile_args(profile):
+    target = AUDIO_PROFILES[profile]
+    return [
+        "-c:a", "libmp3lame",
+        "-ac", str(target["channels"]),
+        "-b:a", f"{target['bit_rate'] // 1000}k",
+        "-ar", str(target["sample_rate"]),
+    ]
+
+def meets_target(stream, profile):
+    """
+    True when the source stream is at least as good as the profile: the same
+    channel count, and bit rate and sample rate no lower. Missing values fail.
+    """
+    target = AUDIO_PROFILES[profile]
+    return (
+        stream.get("channels") == target["channels"]
+        and (stream.get("bit_rate") or 0) >= target["bit_rate"] * REMUX_BIT_RATE_SLACK
+        and (stream.get("sample_rate") or 0) >= target["sample_rate"]
+    )
+
+def selected_profiles():
+    names = [name.strip() for name in AUDIO_PROFILE.split(",") if name.strip()]
+    unknown = [name for name in names if name not in AUDIO_PROFILES]
+    if not names or unknown:
+        raise Exception(f"❌ Unknown AUDIO_PROFILE {unknown or AUDIO_PROFILE!r}; choose from {', '.join(AUDIO_PROFILES)}")
+    return list(dict.fromkeys(names))
+
+# libmp3lame encodes on a single thread and ffmpeg has no option to change
+# that, so a transcode uses one core however many the runner has. The remux
+# path is the only way to skip that cost; with several profiles in one run
+# ffmpeg still decodes the source once.
+def audio_plan(profile, stream):
+    """
+    Returns (path name, output path, ffmpeg codec args) for one profile.
+    """
+    stream = stream or {}
+    if (
+        profile == REMUX_PROFILE
+        and AUDIO_REMUX == "auto"
+        and stream.get("codec_name") in REMUX_CONTAINERS
+        and meets_target(stream, profile)
+    ):
+        extension = REMUX_CONTAINERS[stream["codec_name"]]
+        args = ["-c:a", "copy"]
+        if extension == ".m4a":
+            args += ["-movflags", "+faststart"]
+        return "remux", f"{AUDIO_BASE_PATH}-{profile}{extension}", args
+    return "transcode", f"{AUDIO_BASE_PATH}-{profile}.mp3", profile_args(profile)
+
+def encode_audio(source, input_args=()):
+    """
+    Writes every selected profile from a single ffmpeg run, so the source is
+    read and decoded once. Returns {profile: output path}, published first.
+    """
+    stream = probe_audio_stream(source)
+    if stream:
+        print(
+            f"🔎 Source audio: {stream['codec_name']}, {stream['channels']} ch, "
+            f"{stream['sample_rate']} Hz, {stream['bit_rate'] // 1000 if stream['bit_rate'] else '?'}k"
+        )
+    outputs = {}
+    output_args = []
+    for profile in selected_profiles():
+        path_name, audio_path, codec_args = audio_plan(profile, stream)
+        print(f"🎚️ {profile}: {path_name} path -> {audio_path}")
+        outputs[profile] = audio_path
+        output_args += ["-map", "0:a:0", "-vn", *codec_args, audio_path]
+
+    start = time.monotonic()
+    subprocess.run(["ffmpeg", "-nostdin", "-y", *input_args, "-i", source, *output_args], check=True)
+    print(f"⏱️ Encoded {len(outputs)} profile(s) in {time.monotonic() - start:.1f}s")
+    return outputs
+
+def check_outputs(outputs, expected_duration):
+    for audio_path in outputs.values():
+        check_audio_duration(audio_path, expected_duration)
+
+def extract_audio_streaming(video_url, expected_duration):
+    # ffmpeg fetches the URL itself rather than reading a pipe, so it can
+    # still seek to an MP4 index stored at the end of the file.
+    outputs = encode_audio(video_url, STREAM_INPUT_ARGS)
+    check_outputs(outputs, expected_duration)
+    return outputs
+
+def download_video(video_url):
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        try:
+            return ranged_download.download(video_url, VIDEO_PATH)
+        except Exception as e:
+            if attempt == DOWNLOAD_ATTEMPTS:
+                raise
+            # Finished chunks stay in VIDEO_PATH.parts.json; the next attempt skips them.
+            delay = 10 * attempt
+            print(f"⚠️ Download attempt {attempt} failed ({e}); resuming in {delay}s")
+            time.sleep(delay)
+
+def extract_audio_download(video_url, expected_duration):
+    download_video(video_url)
+    try:
+        outputs = encode_audio(VIDEO_PATH)
+        check_outputs(outputs, expected_duration)
+    finally:
+        if os.path.exists(VIDEO_PATH):
+            os.remove(VIDEO_PATH)
+    return outputs
+
+def extract_audio(video_url, expected_duration=None):
+    """
+    Returns the path of the audio to publish: the first AUDIO_PROFILE. The
+    other profiles are left on disk next to it.
+    """
+    print(f"Extracting audio ({AUDIO_EXTRACT_MODE} mode)...")
+    start = time.monotonic()
+
+    if AUDIO_EXTRACT_MODE == "stream":
+        try:
+            outputs = extract_audio_streaming(video_url, expected_duration)
+        except Exception as e:
+            print(f"⚠️ Streaming extraction failed ({e}); falling back to a full download")
+            outputs = extract_audio_download(video_url, expected_duration)
+    elif AUDIO_EXTRACT_MODE == "download":
+        outputs = extract_audio_download(video_url, expected_duration)
+    else:
+        raise Exception(f"❌ Unknown AUDIO_EXTRACT_MODE: {AUDIO_EXTRACT_MODE}")
+
+    print(f"🎧 Extracted audio in {time.monotonic() - start:.1f}s:")
+    for profile, audio_path in outputs.items():
+        print(f"   {profile}: {audio_path} ({os.path.getsize(audio_path) / 1e6:.1f} MB)")
+    return next(iter(outputs.values()))
 
 # ---------------- SPREAKER ----------------
 def upload_to_spreaker(audio_path, title, description):
@@ -488,7 +747,7 @@ def main():
     print("🗕 Fetching sermon details from Google Sheet...")
     details = get_sheet_details()
     vimeo = get_latest_vimeo_video()
-    audio_path = extract_audio(vimeo["download"])
+    audio_path = extract_audio(vimeo["download"], vimeo.get("duration"))
     spreaker_desc = f"{details['passage']} | {details['preacher']}"
     spreaker_url, episode_id = upload_to_spreaker(audio_path, details["title"], spreaker_desc)
     slug = slugify(details["title"], details["date"])